@@ -0,0 +1,129 @@
+import json
+import os
+import numpy as np
+from .metrics_sink import is_log, iter_log
+
+CACHE_FILE = ".aggregate_cache.json"
+MAX_POINTS = 2000  # points kept per plotted series
+CHUNK_ROWS = 100000
+
+
+class Downsampler:
+    # Bucket means of a streamed series; buckets double in width whenever there are too many of them
+    def __init__(self, max_points=MAX_POINTS):
+        self.max_points = max_points
+        self.stride = 1
+        self.rows = 0
+        self.steps = np.zeros(0)
+        self.values = np.zeros(0)
+        self.counts = np.zeros(0)
+
+    def add(self, steps, values):
+        buckets = (self.rows + np.arange(len(steps))) // self.stride
+        self.rows += len(steps)
+        size = max(len(self.counts), int(buckets[-1]) + 1 if len(buckets) else 0)
+        self.steps = np.bincount(buckets, steps, size) + np.pad(self.steps, (0, size - len(self.steps)))
+        self.values = np.bincount(buckets, values, size) + np.pad(self.values, (0, size - len(self.values)))
+        self.counts = np.bincount(buckets, None, size) + np.pad(self.counts, (0, size - len(self.counts)))
+        while len(self.counts) > 2 * self.max_points:
+            self.merge()
+
+    def merge(self):
+        # Row buckets are rows // stride, so doubling the stride merges neighbouring pairs
+        self.stride *= 2
+        if len(self.counts) % 2:
+            self.steps, self.values, self.counts = (np.append(a, 0.0) for a in (self.steps, self.values, self.counts))
+        self.steps, self.values, self.counts = (a.reshape(-1, 2).sum(axis=1)
+                                                for a in (self.steps, self.values, self.counts))
+
+    def series(self):
+        filled = self.counts > 0
+        counts = self.counts[filled]
+        return (self.steps[filled] / counts).tolist(), (self.values[filled] / counts).tolist()
+
+
+def fingerprint(path):
+    # (mtime, size) of a log; .npyd logs are directories, so use their newest file and total size
+    if os.path.isdir(path):
+        entries = [os.stat(os.path.join(path, name)) for name in os.listdir(path)]
+        return max((e.st_mtime_ns for e in entries), default=0), sum(e.st_size for e in entries)
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def summarize_log(path, metrics, max_points=MAX_POINTS, chunk_rows=CHUNK_ROWS):
+    # One streaming pass over a log: sum/count/min/max and a downsampled series for every metric
+    import pandas as pd
+    totals = {}
+    samplers = {}
+    for chunk in iter_log(path, ["Step"] + list(metrics), chunk_rows):
+        if "Step" not in chunk.columns:
+            continue
+        steps = pd.to_numeric(chunk["Step"], errors="coerce")
+        for metric in metrics:
+            if metric not in chunk.columns:
+                continue
+            values = pd.to_numeric(chunk[metric], errors="coerce")
+            valid = steps.notna() & values.notna()
+            s, v = steps[valid].to_numpy(dtype=float), values[valid].to_numpy(dtype=float)
+            total = totals.setdefault(metric, {"sum": 0.0, "count": 0, "min": None, "max": None})
+            if len(v):
+                total["sum"] += float(v.sum())
+                total["count"] += len(v)
+                total["min"] = float(v.min()) if total["min"] is None else min(total["min"], float(v.min()))
+                total["max"] = float(v.max()) if total["max"] is None else max(total["max"], float(v.max()))
+            samplers.setdefault(metric, Downsampler(max_points)).add(s, v)
+    return {metric: dict(totals[metric], series=samplers[metric].series()) for metric in totals}
+
+
+def load_cache(results_dir):
+    path = os.path.join(results_dir, CACHE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(results_dir, cache):
+    path = os.path.join(results_dir, CACHE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(cache, f)
+    os.replace(path + ".tmp", path)
+
+
+def aggregate(results_dir, metrics, names, max_points=MAX_POINTS, use_cache=True):
+    # Per-log summaries for all metrics at once, for the logs named (relative to results_dir, e.g. catalog
+    # paths); logs unchanged since the cached summary are not read again
+    cache = load_cache(results_dir) if use_cache else {}
+    summaries = {}
+    changed = False
+    for name in sorted(names):
+        path = os.path.join(results_dir, name)
+        if not is_log(path) or not os.path.exists(path):
+            continue
+        key = list(fingerprint(path))
+        entry = cache.get(name)
+        fresh = (entry is not None and entry["fingerprint"] == key and entry["max_points"] == max_points
+                 and all(metric in entry["metrics"] or metric in entry["missing"] for metric in metrics))
+        if not fresh:
+            wanted = set(metrics)
+            if entry is not None and entry["fingerprint"] == key and entry["max_points"] == max_points:
+                wanted |= set(entry["metrics"]) | set(entry["missing"])
+            found = summarize_log(path, sorted(wanted), max_points)
+            entry = {"fingerprint": key, "max_points": max_points, "metrics": found,
+                     "missing": sorted(wanted - set(found))}
+            cache[name] = entry
+            changed = True
+        summaries[name] = entry["metrics"]
+
+    # Forget logs that were deleted
+    for name in list(cache):
+        if not os.path.exists(os.path.join(results_dir, name)):
+            del cache[name]
+            changed = True
+    if use_cache and changed:
+        save_cache(results_dir, cache)
+    return summaries
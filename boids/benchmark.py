@@ -0,0 +1,493 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from .engine import FlockEngine, NEIGHBOR_DISTANCE
+from .neighbors import make_index
+
+WIDTH, HEIGHT = 800, 600
+# Same density as 60 boids on the 800x600 experiment screen
+DENSITY = 60 / (WIDTH * HEIGHT)
+SCALING_COUNTS = [100, 300, 1000, 3000, 10000, 30000, 100000]
+BRUTE_FORCE_LIMIT = 3000  # the dense N x N pass needs O(N^2) memory
+REPEATS = 3
+
+# (backend, neighbor index) -> boid counts for the Environment.update benchmark
+STEP_CONFIGS = {
+    ("python", "brute"): [30, 60, 200],
+    ("numpy", "grid"): [30, 60, 200, 1000]
+}
+# Only checks that Numba is installed: importing it would slow down every benchmark run that skips the jit
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+if HAVE_NUMBA:
+    STEP_CONFIGS[("jit", "grid")] = [30, 60, 200, 1000]
+STEPS = 50
+DRAW_COUNTS = [30, 60, 200, 1000, 5000]
+FRAMES = 50
+# (number of logs, steps per log) for the compare_experiments benchmark
+ANALYSIS_SIZES = [(12, 1200), (48, 20000)]
+
+# Boid counts for ParallelEngine against the single-process FlockEngine, both on the grid index
+PARALLEL_COUNTS = [10000, 30000, 100000]
+
+# Boid counts and steps for the memory / GC-pressure benchmark of the Python backend
+MEMORY_COUNTS = [30, 200]
+MEMORY_STEPS = 50
+
+# Obstacle counts for the obstacle field against checking every obstacle (FlockEngine.avoid), at
+# OBSTACLE_BOIDS boids in a world that keeps OBSTACLE_DENSITY obstacles per 800x600 screen
+OBSTACLE_COUNTS = [10, 100, 1000, 10000]
+OBSTACLE_BOIDS = 2000
+OBSTACLE_DENSITY = 200
+OBSTACLE_FULL_LIMIT = 1000  # checking every obstacle takes seconds per step beyond this
+PREDATOR_COUNTS = [1, 10, 100, 1000, 10000]
+PREDATOR_BOIDS = 10000
+PREDATOR_LOOP_LIMIT = 1000  # one pass over every boid per predator takes seconds per step beyond this
+ENSEMBLE_REPLICAS = [1, 10, 100, 500]
+ENSEMBLE_BOIDS = 30
+ENSEMBLE_STEPS = 20
+# CLI commands timed with --help in a fresh interpreter ("" is `boids --help` itself), and modules timed
+# on import; "run" and "compare" are left out as they have no options and would start right away
+STARTUP_COMMANDS = ["", "experiments", "plot", "catalog", "record", "benchmark", "obstacles"]
+STARTUP_MODULES = ["environment", "experiment_runner", "compare_experiments", "plot_results"]
+
+SUITES = ["step", "draw", "analysis", "neighbors", "parallel", "memory", "obstacles", "predators", "ensemble",
+          "startup"]
+OUTPUT_FILE = os.path.join(os.path.dirname(__file__), "benchmark_results.json")
+TOLERANCE = 0.1
+
+
+def world_for(num_boids):
+    # 4:3 world whose area keeps DENSITY constant
+    width = (num_boids / DENSITY * 4 / 3) ** 0.5
+    return width, width * 3 / 4
+
+
+def random_swarm(num_boids, seed=0):
+    width, height = world_for(num_boids)
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(0, 1, (num_boids, 2)) * (width, height)
+    velocities = rng.uniform(-1, 1, (num_boids, 2))
+    return positions, velocities, width, height
+
+
+def best_time(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def record(suite, name, value, unit, higher_is_better=False, **params):
+    return {"suite": suite, "name": name, "value": value, "unit": unit,
+            "higher_is_better": higher_is_better, **params}
+
+
+def bench_step(configs=STEP_CONFIGS, steps=STEPS):
+    from .environment import Environment
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for (backend, index), counts in configs.items():
+            for num_boids in counts:
+                for predator in (False, True):
+                    env = Environment(WIDTH, HEIGHT, num_boids, with_predator=predator, seed=0,
+                                      log_file=os.path.join(tmp, "log.csv"),
+                                      backend=backend, neighbor_index=index)
+                    env.update()  # opens the log
+                    elapsed = best_time(lambda: [env.update() for _ in range(steps)], repeats=1)
+                    env.close()
+                    records.append(record("step", f"{backend}/{index}/{num_boids}/{'pred' if predator else 'nopred'}",
+                                          steps / elapsed, "steps/s", True, backend=backend, index=index,
+                                          boids=num_boids, predator=predator))
+    return records
+
+
+def bench_draw(counts=DRAW_COUNTS, frames=FRAMES):
+    import pygame
+    from .environment import Environment
+    from .renderer import SpriteRenderer
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    renderer = SpriteRenderer()
+    records = []
+    for num_boids in counts:
+        env = Environment(WIDTH, HEIGHT, num_boids, with_predator=True, seed=0, log_file=None)
+
+        def frame():
+            surface.fill((0, 0, 0))
+            env.draw(surface)
+
+        def sprite_frame():
+            surface.fill((0, 0, 0))
+            renderer.draw(env, surface)
+
+        def boids_only():
+            for boid in env.boids:
+                boid.draw(surface)
+
+        per_frame = best_time(lambda: [frame() for _ in range(frames)]) / frames
+        per_boid = best_time(lambda: [boids_only() for _ in range(frames)]) / (frames * num_boids)
+        per_sprite_frame = best_time(lambda: [sprite_frame() for _ in range(frames)]) / frames
+        records.append(record("draw", f"frame/{num_boids}", per_frame * 1000, "ms", boids=num_boids))
+        records.append(record("draw", f"sprite_frame/{num_boids}", per_sprite_frame * 1000, "ms", boids=num_boids))
+        records.append(record("draw", f"boid/{num_boids}", per_boid * 1e6, "us", boids=num_boids))
+    return records
+
+
+def write_synthetic_logs(results_dir, num_logs, steps, seed=0):
+    from .metrics_sink import open_sink
+    rng = np.random.default_rng(seed)
+    configs = [(boids, weights, pred) for boids in (30, 60)
+               for weights in ("1.0_ali1.0_coh1.0", "2.0_ali0.5_coh0.5", "0.5_ali2.0_coh1.5")
+               for pred in (False, True)]
+    for n in range(num_logs):
+        boids, weights, pred = configs[n % len(configs)]
+        # Copies of a config get a bumped boid count so every log has its own label
+        label = f"{boids + n // len(configs)}boids_sep{weights}{'_pred' if pred else ''}"
+        path = os.path.join(results_dir, f"simulation_log_{label}.csv")
+        distance = 90 + np.cumsum(rng.normal(0, 0.5, steps))
+        collisions = rng.poisson(1.0, steps)
+        with open_sink(path, ["Step", "Avg Distance to Center", "Collisions", "With Predator"]) as sink:
+            for step in range(steps):
+                sink.write([step, distance[step], collisions[step], int(pred)])
+
+
+def bench_analysis(sizes=ANALYSIS_SIZES):
+    from .catalog import connect, import_existing
+    from .compare_experiments import plot_combined_metric
+    records = []
+    for num_logs, steps in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_synthetic_logs(tmp, num_logs, steps)
+            db = connect(tmp)
+            import_existing(db, tmp)
+            db.close()
+
+            def analyse():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    plot_combined_metric("Avg Distance to Center", "Average Distance to Center", "Avg Distance",
+                                         results_dir=tmp, show=False)
+                    plot_combined_metric("Collisions", "Collision Count", "Number of Collisions",
+                                         results_dir=tmp, show=False)
+
+            elapsed = best_time(analyse, repeats=1)
+        records.append(record("analysis", f"plot_combined_metric/{num_logs}x{steps}", elapsed, "s",
+                              logs=num_logs, steps=steps))
+    return records
+
+
+def bench_neighbors(counts=SCALING_COUNTS, indexes=("brute", "grid")):
+    records = []
+    for num_boids in counts:
+        positions, velocities, width, height = random_swarm(num_boids)
+        for kind in indexes:
+            if kind == "brute" and num_boids > BRUTE_FORCE_LIMIT:
+                continue
+            index = make_index(kind, width, height)
+            query = best_time(lambda: index.pairs(positions, NEIGHBOR_DISTANCE))
+            engine = FlockEngine(positions, velocities, width, height, index)
+            step = best_time(engine.step)
+            records.append(record("neighbors", f"pairs/{kind}/{num_boids}", query * 1000, "ms",
+                                  index=kind, boids=num_boids))
+            records.append(record("neighbors", f"engine_step/{kind}/{num_boids}", 1 / step, "steps/s", True,
+                                  index=kind, boids=num_boids))
+    return records
+
+
+def bench_parallel(counts=PARALLEL_COUNTS, workers=None):
+    from .parallel import ParallelEngine
+    records = []
+    for num_boids in counts:
+        positions, velocities, width, height = random_swarm(num_boids)
+        single = FlockEngine(positions, velocities, width, height, make_index("grid", width, height))
+        tiled = ParallelEngine(positions, velocities, width, height, make_index("grid", width, height), workers)
+        try:
+            tiled.step()  # workers are up and warm
+            for name, engine in (("single", single), ("parallel", tiled)):
+                records.append(record("parallel", f"{name}/{num_boids}", 1 / best_time(engine.step), "steps/s", True,
+                                      boids=num_boids, workers=getattr(engine, "workers", 1)))
+        finally:
+            tiled.close()
+    return records
+
+
+def bench_obstacles(counts=OBSTACLE_COUNTS, num_boids=OBSTACLE_BOIDS):
+    from .obstacles import ObstacleField, random_obstacle_map
+    records = []
+    for count in counts:
+        scale = max(1.0, (count / OBSTACLE_DENSITY) ** 0.5)
+        width, height = WIDTH * scale, HEIGHT * scale
+        obstacles = random_obstacle_map(count, width, height)
+        rng = np.random.default_rng(0)
+        positions = rng.uniform(0, 1, (num_boids, 2)) * (width, height)
+        engine = FlockEngine(positions, np.zeros_like(positions), width, height)
+        build = best_time(lambda: ObstacleField(obstacles, "sdf"))
+        records.append(record("obstacles", f"build/{count}", build * 1000, "ms", obstacles=count))
+        for mode in ("center", "sdf"):
+            field = ObstacleField(obstacles, mode)
+            query = best_time(lambda: field.forces(positions))
+            records.append(record("obstacles", f"field/{mode}/{count}", query * 1000, "ms",
+                                  obstacles=count, boids=num_boids, avoidance=mode))
+        if count <= OBSTACLE_FULL_LIMIT:
+            centers = [(o.position.x, o.position.y) for o in obstacles]
+            sizes = [o.size for o in obstacles]
+            full = best_time(lambda: engine.avoid(centers, sizes))
+            records.append(record("obstacles", f"every_obstacle/{count}", full * 1000, "ms",
+                                  obstacles=count, boids=num_boids))
+    return records
+
+
+def bench_predators(counts=PREDATOR_COUNTS, num_boids=PREDATOR_BOIDS):
+    from .engine import PREDATOR_RANGE, PREDATOR_STRENGTH, flee_forces, lengths
+    from .predators import PredatorSwarm
+    records = []
+    positions, velocities, width, height = random_swarm(num_boids)
+    index = make_index("grid", width, height)
+    index.build(positions)
+    for count in counts:
+        rng = np.random.default_rng(1)
+        predators = rng.uniform(0, 1, (count, 2)) * (width, height)
+        batched = best_time(lambda: flee_forces(positions, predators, index))
+        records.append(record("predators", f"flee/{count}", batched * 1000, "ms", predators=count, boids=num_boids))
+        if count <= PREDATOR_LOOP_LIMIT:
+            def every_predator():
+                # The previous approach: one dense pass over the swarm per predator
+                force = np.zeros_like(positions)
+                for predator in predators:
+                    away = positions - predator
+                    distances = lengths(away)
+                    active = (distances > 0) & (distances < PREDATOR_RANGE)
+                    strength = np.divide(PREDATOR_RANGE - distances, PREDATOR_RANGE * distances,
+                                         out=np.zeros_like(distances), where=active)
+                    force += away * (strength * PREDATOR_STRENGTH)[:, None]
+                return force
+            full = best_time(every_predator)
+            records.append(record("predators", f"every_predator/{count}", full * 1000, "ms",
+                                  predators=count, boids=num_boids))
+        swarm = PredatorSwarm(predators, np.zeros_like(predators), width, height, "chase")
+        chase = best_time(lambda: swarm.move(positions, index))
+        records.append(record("predators", f"chase/{count}", chase * 1000, "ms", predators=count, boids=num_boids))
+    return records
+
+
+def bench_ensemble(replicas=ENSEMBLE_REPLICAS, num_boids=ENSEMBLE_BOIDS, steps=ENSEMBLE_STEPS):
+    from .ensemble import Ensemble
+    from .environment import Environment
+    from .experiment_runner import WEIGHT_SETS
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in replicas:
+            def environments(tag):
+                envs = [Environment(WIDTH, HEIGHT, num_boids, *WEIGHT_SETS[k % len(WEIGHT_SETS)],
+                                    with_predator=k % 2 == 1, seed=k, backend="numpy",
+                                    log_file=os.path.join(tmp, f"{tag}_{k}.csv")) for k in range(count)]
+                for env in envs:
+                    env.update()  # opens the log
+                return envs
+            envs = environments("alone")
+            elapsed = best_time(lambda: [env.update() for env in envs for _ in range(steps)], repeats=1)
+            records.append(record("ensemble", f"separate/{count}", count * steps / elapsed, "replica-steps/s", True,
+                                  replicas=count, boids=num_boids))
+            for env in envs:
+                env.close()
+            ensemble = Ensemble(environments("ensemble"))
+            elapsed = best_time(lambda: ensemble.run(steps), repeats=1)
+            records.append(record("ensemble", f"ensemble/{count}", count * steps / elapsed, "replica-steps/s", True,
+                                  replicas=count, boids=num_boids))
+            ensemble.close()
+    return records
+
+
+def counting_vectors():
+    # Vector2 subclass that counts its instances as they are freed; pygame's vector operators return
+    # the class of their operand, so every temporary made from a counted vector is counted too
+    import pygame
+
+    class CountedVector2(pygame.Vector2):
+        __slots__ = ()
+        freed = 0
+
+        def __del__(self):
+            CountedVector2.freed += 1
+
+    return CountedVector2
+
+
+def count_vectors(env, vector_class):
+    for boid in env.boids:
+        boid.position, boid.velocity, boid.acceleration = (
+            vector_class(boid.position), vector_class(boid.velocity), vector_class(boid.acceleration))
+
+
+def vector_rules(env):
+    # The Vector2 flocking rules of utils, as Boid.apply_behavior ran them before utils.flock
+    from .utils import separation, alignment, cohesion
+    for boid in env.boids:
+        boid.acceleration += (separation(boid, env.boids) * env.separation_strength
+                              + alignment(boid, env.boids, neighbor_dist=100) * env.alignment_strength
+                              + cohesion(boid, env.boids, neighbor_dist=100) * env.cohesion_strength)
+
+
+def bench_memory(counts=MEMORY_COUNTS, steps=MEMORY_STEPS):
+    import gc
+    import tracemalloc
+    from .boid import Boid
+    from .environment import Environment
+    vector_class = counting_vectors()
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_boids in counts:
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            boids = [Boid(WIDTH, HEIGHT) for _ in range(num_boids)]
+            per_boid = (tracemalloc.get_traced_memory()[0] - before) / num_boids
+            tracemalloc.stop()
+            del boids
+            records.append(record("memory", f"boid_bytes/{num_boids}", per_boid, "bytes", boids=num_boids))
+
+            env = Environment(WIDTH, HEIGHT, num_boids, with_predator=True, seed=0,
+                              log_file=os.path.join(tmp, "log.csv"))
+            env.update()
+            collections = sum(generation["collections"] for generation in gc.get_stats())
+            for _ in range(steps):
+                env.update()
+            collections = sum(generation["collections"] for generation in gc.get_stats()) - collections
+            records.append(record("memory", f"gc_collections_per_1000_steps/{num_boids}", collections * 1000 / steps,
+                                  "collections", boids=num_boids))
+
+            tracemalloc.start()
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            env.update()
+            peak = tracemalloc.get_traced_memory()[1] - current
+            tracemalloc.stop()
+            records.append(record("memory", f"step_peak_bytes/{num_boids}", peak, "bytes", boids=num_boids))
+
+            # Vector2 objects created (and freed again) per boid and step
+            count_vectors(env, vector_class)
+            vector_class.freed = 0
+            for _ in range(steps):
+                env.update()
+            records.append(record("memory", f"step_vectors_per_boid/{num_boids}",
+                                  vector_class.freed / (steps * num_boids), "vectors", boids=num_boids))
+            # The rules make their zero vectors from the boids' vector class, so these are counted too
+            vector_class.freed = 0
+            for _ in range(steps):
+                vector_rules(env)
+                for boid in env.boids:
+                    boid.acceleration *= 0
+            records.append(record("memory", f"vector2_rules_vectors_per_boid/{num_boids}",
+                                  vector_class.freed / (steps * num_boids), "vectors", boids=num_boids))
+            env.close()
+    return records
+
+
+def bench_startup(commands=STARTUP_COMMANDS, modules=STARTUP_MODULES):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    records = []
+
+    def launch(args, cwd):
+        subprocess.run([sys.executable] + args, cwd=cwd, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for command in commands:
+        args = ["-m", "boids"] + ([command] if command else []) + ["--help"]
+        elapsed = best_time(lambda: launch(args, root))
+        records.append(record("startup", f"help/{command or 'boids'}", elapsed * 1000, "ms", command=command))
+    for module in modules:
+        elapsed = best_time(lambda: launch(["-c", f"import boids.{module}"], root))
+        records.append(record("startup", f"import/{module}", elapsed * 1000, "ms", module=module))
+    return records
+
+
+BENCHMARKS = {
+    "step": bench_step,
+    "draw": bench_draw,
+    "analysis": bench_analysis,
+    "neighbors": bench_neighbors,
+    "parallel": bench_parallel,
+    "memory": bench_memory,
+    "obstacles": bench_obstacles,
+    "predators": bench_predators,
+    "ensemble": bench_ensemble,
+    "startup": bench_startup
+}
+
+
+def run_suites(suites=SUITES):
+    records = []
+    for suite in suites:
+        print(f"Running {suite} benchmarks...")
+        records.extend(BENCHMARKS[suite]())
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": records
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    # Positive change means faster than the baseline; returns the regressions beyond tolerance
+    previous = {(r["suite"], r["name"]): r for r in baseline["results"]}
+    regressions = []
+    for r in report["results"]:
+        old = previous.get((r["suite"], r["name"]))
+        if old is None or not old["value"] or not r["value"]:
+            continue
+        ratio = r["value"] / old["value"] if r["higher_is_better"] else old["value"] / r["value"]
+        change = ratio - 1
+        flag = ""
+        if change < -tolerance:
+            flag = "  REGRESSION"
+            regressions.append(r)
+        print(f"{r['suite']:>10}  {r['name']:<40} {old['value']:>12.3f} -> {r['value']:>12.3f} {r['unit']:<8}"
+              f" {change:+7.1%}{flag}")
+    return regressions
+
+
+def print_report(report):
+    for r in report["results"]:
+        print(f"{r['suite']:>10}  {r['name']:<40} {r['value']:>12.3f} {r['unit']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the boids simulation, rendering and analysis.")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES,
+                        help="benchmark suites to run (default: all)")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="JSON file for the results")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown before a result counts as a regression (default 0.1 = 10%%)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = run_suites(args.suites)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"[⚠] {len(regressions)} benchmarks slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,35 @@
-import pygame
 import random
 import math
+from .utils import flock
 
 MAX_SPEED = 2
 MAX_FORCE = 0.05
 
+# Start position and velocity of a new boid; the array backends draw these without creating Boids,
+# with the same calls in the same order, so a seed gives them the same swarm
+def random_position(width, height, rng):
+    return rng.uniform(width / 3, 2 * width / 3), rng.uniform(height / 3, 2 * height / 3)
+
+def random_velocity(rng):
+    return rng.uniform(-1, 1), rng.uniform(-1, 1)
+
 class Boid:
-    def __init__(self, width, height):
-        self.position = pygame.Vector2(
-            random.uniform(width / 3, 2 * width / 3),
-            random.uniform(height / 3, 2 * height / 3)
-        )
-        self.velocity = pygame.Vector2(random.uniform(-1, 1), random.uniform(-1, 1))
-        self.acceleration = pygame.Vector2(0, 0)
+    # No per-instance __dict__; color and is_predator are only set on the predator
+    __slots__ = ("position", "velocity", "acceleration", "width", "height", "color", "is_predator")
+
+    def __init__(self, width, height, rng=None, position=None, velocity=None):
+        # rng is a random.Random; the module-level generator is used when none is given
+        rng = rng if rng is not None else random
+        if position is None:
+            position = random_position(width, height, rng)
+        if velocity is None:
+            velocity = random_velocity(rng)
+        # Imported here rather than with the module: headless runs on the array backends create no Boids
+        # and never load pygame
+        from pygame import Vector2
+        self.position = Vector2(position)
+        self.velocity = Vector2(velocity)
+        self.acceleration = Vector2(0, 0)
         self.width = width
         self.height = height
 
@@ -25,13 +42,12 @@ class Boid:
         self.wrap_around()
 
     def apply_behavior(self, boids, sep_weight=1.0, ali_weight=1.0, coh_weight=1.0):
-        from utils import separation, alignment, cohesion
-        sep = separation(self, boids) * sep_weight
-        ali = alignment(self, boids, neighbor_dist=100) * ali_weight
-        coh = cohesion(self, boids, neighbor_dist=100) * coh_weight
-        self.acceleration += sep + ali + coh
+        # Same result as separation(...) * sep_weight + alignment(...) * ali_weight + cohesion(...) * coh_weight,
+        # accumulated in place in one pass
+        flock(self, boids, sep_weight, ali_weight, coh_weight)
 
     def draw(self, screen):
+        import pygame
         angle = self.velocity.angle_to(pygame.Vector2(1, 0))
         points = [
             (self.position.x + 10 * math.cos(math.radians(angle)),
@@ -0,0 +1,150 @@
+import argparse
+import os
+import re
+import sqlite3
+from datetime import datetime
+from .metrics_sink import is_log, log_format, iter_log
+
+RESULTS_DIR = "results"  # relative to the working directory
+CATALOG_FILE = "catalog.sqlite"
+TEMP_LOG = "simulation_log_temp"
+
+COLUMNS = [
+    ("path", "TEXT NOT NULL UNIQUE"),  # relative to the results directory
+    ("label", "TEXT"),
+    ("num_boids", "INTEGER"),
+    ("separation", "REAL"),
+    ("alignment", "REAL"),
+    ("cohesion", "REAL"),
+    ("with_predator", "INTEGER"),
+    ("seed", "INTEGER"),
+    ("steps", "INTEGER"),
+    ("wall_time", "REAL"),
+    ("steps_per_second", "REAL"),
+    ("backend", "TEXT"),
+    ("log_format", "TEXT"),
+    ("recorded", "TEXT")
+]
+NAMES = [name for name, _ in COLUMNS]
+# Filters that may be passed to find_runs
+FILTERS = ["num_boids", "separation", "alignment", "cohesion", "with_predator", "seed", "backend", "log_format",
+           "label"]
+
+
+def connect(results_dir=RESULTS_DIR):
+    # Opens (and if needed creates) the catalog that sits in the results directory
+    os.makedirs(results_dir, exist_ok=True)
+    db = sqlite3.connect(os.path.join(results_dir, CATALOG_FILE))
+    db.row_factory = sqlite3.Row
+    db.execute(f"CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, "
+               f"{', '.join(f'{name} {kind}' for name, kind in COLUMNS)})")
+    db.execute("CREATE INDEX IF NOT EXISTS runs_config ON runs (num_boids, with_predator, separation, alignment, "
+               "cohesion)")
+    db.execute("CREATE INDEX IF NOT EXISTS runs_weights ON runs (separation, alignment, cohesion)")
+    db.commit()
+    return db
+
+
+def record_run(db, results_dir, log_file, **fields):
+    # Insert or replace the entry for one finished log; fields are any of NAMES
+    fields["path"] = os.path.relpath(log_file, results_dir)
+    fields.setdefault("log_format", log_format(log_file))
+    fields.setdefault("recorded", datetime.now().isoformat(timespec="seconds"))
+    if fields.get("steps") and fields.get("wall_time"):
+        fields.setdefault("steps_per_second", fields["steps"] / fields["wall_time"])
+    names = [name for name in NAMES if name in fields]
+    db.execute(f"INSERT OR REPLACE INTO runs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+               [fields[name] for name in names])
+    db.commit()
+
+
+def parse_label(filename):
+    # Configuration encoded in the name of a log written before the catalog existed
+    match = re.search(r'(\d+)boids_sep(\d+(?:\.\d+)?)_ali(\d+(?:\.\d+)?)_coh(\d+(?:\.\d+)?)(_pred)?', filename)
+    if match is None:
+        return None
+    return {"num_boids": int(match.group(1)),
+            "separation": float(match.group(2)),
+            "alignment": float(match.group(3)),
+            "cohesion": float(match.group(4)),
+            "with_predator": match.group(5) is not None,
+            "label": match.group(0)}
+
+
+def count_steps(path):
+    return sum(len(chunk) for chunk in iter_log(path, ["Step"]))
+
+
+def import_existing(db, results_dir=RESULTS_DIR):
+    # Adds logs that are not in the catalog yet; returns how many were added
+    known = {row["path"] for row in db.execute("SELECT path FROM runs")}
+    added = 0
+    for name in sorted(os.listdir(results_dir)):
+        # The temporary log of a run outside the experiment runner is no experiment
+        if name in known or not is_log(name) or not name.startswith("simulation_log_") or name.startswith(TEMP_LOG):
+            continue
+        config = parse_label(name)
+        if config is None:
+            print(f"[⚠] Cannot tell the configuration of {name}, not imported")
+            continue
+        path = os.path.join(results_dir, name)
+        record_run(db, results_dir, path, steps=count_steps(path), **config)
+        added += 1
+    return added
+
+
+def forget_missing(db, results_dir=RESULTS_DIR):
+    # Drops entries whose log file was deleted
+    missing = [row["path"] for row in db.execute("SELECT path FROM runs")
+               if not os.path.exists(os.path.join(results_dir, row["path"]))]
+    db.executemany("DELETE FROM runs WHERE path = ?", [(path,) for path in missing])
+    db.commit()
+    return len(missing)
+
+
+def find_runs(db, **filters):
+    # e.g. find_runs(db, num_boids=60, with_predator=True); returns dicts ordered by path
+    unknown = set(filters) - set(FILTERS)
+    if unknown:
+        raise ValueError(f"Unknown catalog filter(s): {', '.join(sorted(unknown))}")
+    where = " AND ".join(f"{name} = ?" for name in filters)
+    query = "SELECT * FROM runs" + (f" WHERE {where}" if where else "") + " ORDER BY path"
+    return [dict(row) for row in db.execute(query, list(filters.values()))]
+
+
+def run_label(run):
+    # Legend label used by the comparison plots
+    weights = f"sep{run['separation']}_ali{run['alignment']}_coh{run['cohesion']}"
+    return f"{run['num_boids']}b_{weights} ({'Pred' if run['with_predator'] else 'NoPred'})"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="List or import runs in the results catalog.")
+    parser.add_argument("--results-dir", "--results", dest="results", default=RESULTS_DIR,
+                        help=f"results directory holding the catalog (default: ./{RESULTS_DIR})")
+    parser.add_argument("--import-existing", action="store_true",
+                        help="add logs already in the results directory that the catalog does not know yet")
+    parser.add_argument("--boids", type=int, help="only runs with this many boids")
+    parser.add_argument("--predator", choices=["on", "off"], help="only runs with or without the predator")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = connect(args.results)
+    if args.import_existing:
+        print(f"Imported {import_existing(db, args.results)} logs, "
+              f"removed {forget_missing(db, args.results)} missing ones")
+    filters = {}
+    if args.boids is not None:
+        filters["num_boids"] = args.boids
+    if args.predator is not None:
+        filters["with_predator"] = args.predator == "on"
+    for run in find_runs(db, **filters):
+        speed = f"{run['steps_per_second']:.0f} steps/s" if run["steps_per_second"] else "-"
+        print(f"{run['path']:<60} {run['steps'] or 0:>7} steps  seed {run['seed']}  {speed}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import importlib
+import sys
+
+# Command -> (module, help). A command's module is only imported once it is chosen, so `boids --help`
+# and commands that never simulate or plot do not wait for pygame, Numba, pandas or plotly
+COMMANDS = {
+    "run": ("main", "interactive fullscreen simulation"),
+    "experiments": ("experiment_runner", "run the experiment grid, windowed or --headless"),
+    "compare": ("compare_experiments", "plot every logged run against the others"),
+    "plot": ("plot_results", "plot the metrics of one run"),
+    "catalog": ("catalog", "list or import runs in the results catalog"),
+    "record": ("record", "record a simulation offscreen to images or video"),
+    "benchmark": ("benchmark", "benchmark the simulation, rendering and analysis"),
+    "obstacles": ("obstacles", "write a random obstacle map"),
+    "verify": ("verify_engine", "check the NumPy and Numba engines against the Boid/utils rules")
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="boids", description="2D boids swarm simulation and experiments.")
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+    for name, (_, description) in COMMANDS.items():
+        # Everything after the command, --help included, is left for the command's own parser
+        commands.add_parser(name, help=description, add_help=False)
+    return parser.parse_known_args(argv)
+
+
+def main(argv=None):
+    args, rest = parse_args(sys.argv[1:] if argv is None else argv)
+    module = importlib.import_module("." + COMMANDS[args.command][0], __package__)
+    # The command reads its options from sys.argv, just as with python -m boids.<module>
+    sys.argv = [f"boids {args.command}"] + rest
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,70 @@
-import plotly.express as px
-import pandas as pd
+import argparse
 import os
-import re
-
-def extract_metadata(filename):
-    match = re.search(r'(\d+)boids_sep([\d.]+)_ali([\d.]+)_coh([\d.]+)(_pred)?', filename)
-    if match:
-        boids = match.group(1)
-        sep = match.group(2)
-        ali = match.group(3)
-        coh = match.group(4)
-        pred = match.group(5) is not None
-        return f"{boids}b_sep{sep}_ali{ali}_coh{coh}", pred
-    return filename, False
-
-def plot_combined_metric(metric, label, ylabel):
-    summary_file = os.path.join(os.path.dirname(__file__), "results", f"summary_{metric.replace(' ', '_')}.csv")
-    results_dir = os.path.join(os.path.dirname(__file__), "results")
-    files = [f for f in os.listdir(results_dir) if f.endswith(".csv")]
-
-    combined_data = []
-
-    for file in sorted(files):
-        path = os.path.join(results_dir, file)
-        df = pd.read_csv(path)
-        if metric not in df.columns:
+from .aggregate import aggregate
+from .catalog import connect, import_existing, find_runs, run_label
+
+RESULTS_DIR = "results"  # relative to the working directory
+
+def catalog_labels(results_dir=RESULTS_DIR, import_logs=False):
+    # Plot labels by log file for the catalogued runs whose log is still there; with import_logs,
+    # logs the catalog does not know yet are imported first (catalog --import-existing)
+    db = connect(results_dir)
+    if import_logs:
+        import_existing(db, results_dir)
+    labels = {run["path"]: run_label(run) for run in find_runs(db)
+              if os.path.exists(os.path.join(results_dir, run["path"]))}
+    db.close()
+    return labels
+
+def plot_combined_metric(metric, label, ylabel, results_dir=RESULTS_DIR, show=True, summaries=None, labels=None):
+    # The runs to plot come from the catalog (labels, from catalog_labels); summaries comes from aggregate(),
+    # each log is read once, in chunks, and only when it changed.
+    # pandas and plotly are imported here so that importing this module (or the CLI) stays quick
+    import pandas as pd
+    import plotly.express as px
+    summary_file = os.path.join(results_dir, f"summary_{metric.replace(' ', '_')}.csv")
+    if labels is None:
+        labels = catalog_labels(results_dir)
+    if summaries is None:
+        summaries = aggregate(results_dir, [metric], list(labels))
+
+    series = []
+    totals = {}
+    for file, label_of_run in sorted(labels.items()):
+        metrics = summaries.get(file, {})
+        if metric not in metrics:
             continue
 
-        base_label, predator = extract_metadata(file)
-        df['Label'] = f"{base_label} ({'Pred' if predator else 'NoPred'})"
-        combined_data.append(df[['Step', metric, 'Label']])
+        steps, values = metrics[metric]["series"]
+        series.append(pd.DataFrame({'Step': steps, metric: values, 'Label': label_of_run}))
+        total = totals.setdefault(label_of_run, [0.0, 0])
+        total[0] += metrics[metric]["sum"]
+        total[1] += metrics[metric]["count"]
 
-    if not combined_data:
+    if not series:
         print("No data found for metric:", metric)
         return
 
-    all_data = pd.concat(combined_data, ignore_index=True)
-
-    # Explicit numeric conversion to ensure clean data
-    all_data["Step"] = pd.to_numeric(all_data["Step"], errors='coerce')
-    all_data[metric] = pd.to_numeric(all_data[metric], errors='coerce')
-
-    # Drop NaNs immediately to ensure clean plotting
-    all_data.dropna(subset=["Step", metric], inplace=True)
-
-    # Ensure data is sorted by Step
-    all_data.sort_values(by="Step", inplace=True)
-
-    # Generate and show plot
-    fig = px.line(all_data, x='Step', y=metric, color='Label', title=label)
+    # Plot the downsampled series rather than every step
+    plot_data = pd.concat(series, ignore_index=True)
+    fig = px.line(plot_data, x='Step', y=metric, color='Label', title=label)
     fig.update_layout(yaxis_title=ylabel, xaxis_title='Step')
-    fig.show()
+    if show:
+        fig.show()
 
-    # Generate summary safely
-    summary = all_data.groupby('Label', as_index=False).agg({metric: 'mean'})
-    summary.columns = ['Label', f'Average {metric}']
+    # Means over every logged step, combined from the per-log sums and counts
+    summary = pd.DataFrame([(name, total / count if count else float("nan"))
+                            for name, (total, count) in sorted(totals.items())],
+                           columns=['Label', f'Average {metric}'])
     summary.to_csv(summary_file, index=False)
 
     print(f"Summary exported to {summary_file}")
-if __name__ == "__main__":
-    print("Plotting average distance (group cohesion)...")
-    plot_combined_metric("Avg Distance to Center", "Average Distance to Center", "Avg Distance")
-
-    print("Plotting collisions...")
-    plot_combined_metric("Collisions", "Collision Count", "Number of Collisions")
 
 # Optional: generate focused view for one config
-def plot_focused_config(metric, config_name, label_suffix):
-    summary_file = os.path.join(os.path.dirname(__file__), "results", f"summary_{metric.replace(' ', '_')}.csv")
+def plot_focused_config(metric, config_name, label_suffix, results_dir=RESULTS_DIR):
+    import pandas as pd
+    import plotly.express as px
+    summary_file = os.path.join(results_dir, f"summary_{metric.replace(' ', '_')}.csv")
     if not os.path.exists(summary_file):
         print(f"[⚠] Summary file not found: {summary_file}")
         return
@@ -82,8 +79,36 @@ def plot_focused_config(metric, config_name, label_suffix):
                  labels={f'Average {metric}': metric})
     fig.show()
 
-# Call examples
-plot_focused_config("Avg Distance to Center", "30b_sep1.0_ali1.0_coh1.0", "Predator Effect on Cohesion")
-plot_focused_config("Collisions", "30b_sep1.0_ali1.0_coh1.0", "Predator Effect on Collisions")
-plot_focused_config("Avg Distance to Center", "30b_sep0.5_ali2.0_coh1.5", "Predator Effect on Cohesion – High Cohesion")
-plot_focused_config("Collisions", "30b_sep0.5_ali2.0_coh1.5", "Predator Effect on Collisions – High Cohesion")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plot every logged run against the others.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR,
+                        help=f"results directory with the logs and the catalog (default: ./{RESULTS_DIR})")
+    parser.add_argument("--import-existing", action="store_true",
+                        help="first add logs in the results directory that the catalog does not know yet")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results_dir = args.results_dir
+    # The catalogued runs, and one pass over their logs for both metrics
+    labels = catalog_labels(results_dir, args.import_existing)
+    summaries = aggregate(results_dir, ["Avg Distance to Center", "Collisions"], list(labels))
+
+    print("Plotting average distance (group cohesion)...")
+    plot_combined_metric("Avg Distance to Center", "Average Distance to Center", "Avg Distance",
+                         results_dir=results_dir, summaries=summaries, labels=labels)
+
+    print("Plotting collisions...")
+    plot_combined_metric("Collisions", "Collision Count", "Number of Collisions",
+                         results_dir=results_dir, summaries=summaries, labels=labels)
+
+    # Call examples
+    plot_focused_config("Avg Distance to Center", "30b_sep1.0_ali1.0_coh1.0", "Predator Effect on Cohesion", results_dir)
+    plot_focused_config("Collisions", "30b_sep1.0_ali1.0_coh1.0", "Predator Effect on Collisions", results_dir)
+    plot_focused_config("Avg Distance to Center", "30b_sep0.5_ali2.0_coh1.5", "Predator Effect on Cohesion – High Cohesion",
+                        results_dir)
+    plot_focused_config("Collisions", "30b_sep0.5_ali2.0_coh1.5", "Predator Effect on Collisions – High Cohesion",
+                        results_dir)
+
+if __name__ == "__main__":
+    main()
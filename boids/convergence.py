@@ -0,0 +1,62 @@
+from collections import deque
+
+CONVERGENCE_WINDOW = 120  # steps per rolling window (2 seconds at 60 FPS)
+CONVERGENCE_TOLERANCE = 0.05  # largest relative change of a window mean that still counts as steady
+# Changes are measured relative to at least this much, so a statistic that hovers around zero
+# (e.g. 0 or 1 collisions per step) is not held to a tolerance of a fraction of a collision
+CONVERGENCE_FLOOR = 1.0
+# Logged statistics the monitor follows, in the order observe() takes them
+STATISTICS = ["Avg Distance to Center", "Collisions"]
+
+
+class ConvergenceMonitor:
+    # Rolling means of the logged statistics over the last two windows of `window` steps. The run has
+    # converged once no mean moved by more than `tolerance` (relative) from one window to the next;
+    # samples arrive every `every` steps, with the metrics log
+    def __init__(self, window=CONVERGENCE_WINDOW, tolerance=CONVERGENCE_TOLERANCE, every=1):
+        if window < 1:
+            raise ValueError("Convergence window must be at least 1 step")
+        if tolerance < 0:
+            raise ValueError("Convergence tolerance cannot be negative")
+        self.window = window
+        self.tolerance = tolerance
+        self.size = max(1, -(-window // every))  # samples per window
+        self.previous, self.recent = deque(), deque()
+        # Running sums of each statistic over the two windows
+        self.previous_sums = [0.0] * len(STATISTICS)
+        self.recent_sums = [0.0] * len(STATISTICS)
+        self.changes = None
+        self.converged_at = None
+
+    @property
+    def converged(self):
+        return self.converged_at is not None
+
+    def means(self):
+        # (previous window, last window) means of every statistic, None before both windows are full
+        if len(self.previous) < self.size:
+            return None
+        return ([total / self.size for total in self.previous_sums],
+                [total / self.size for total in self.recent_sums])
+
+    def observe(self, step, values):
+        # values: one sample of every statistic, in STATISTICS order; returns True once converged
+        if self.converged:
+            return True
+        self.recent.append(values)
+        self.recent_sums = [total + value for total, value in zip(self.recent_sums, values)]
+        if len(self.recent) > self.size:
+            moved = self.recent.popleft()
+            self.recent_sums = [total - value for total, value in zip(self.recent_sums, moved)]
+            self.previous.append(moved)
+            self.previous_sums = [total + value for total, value in zip(self.previous_sums, moved)]
+            if len(self.previous) > self.size:
+                dropped = self.previous.popleft()
+                self.previous_sums = [total - value for total, value in zip(self.previous_sums, dropped)]
+        means = self.means()
+        if means is None:
+            return False
+        self.changes = [abs(new - old) / max(abs(old), abs(new), CONVERGENCE_FLOOR) for old, new in zip(*means)]
+        if max(self.changes) <= self.tolerance:
+            self.converged_at = step
+        return self.converged
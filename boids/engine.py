@@ -0,0 +1,213 @@
+import numpy as np
+from .boid import MAX_SPEED, MAX_FORCE
+from .utils import MAX_SPEED as DESIRED_SPEED
+from .neighbors import BruteForceIndex
+
+SEPARATION_DISTANCE = 20
+NEIGHBOR_DISTANCE = 100
+COLLISION_DISTANCE = 5
+PREDATOR_RANGE = 100
+PREDATOR_STRENGTH = 2.0
+OBSTACLE_MARGIN = 30
+OBSTACLE_STRENGTH = 1.5
+LEADER_SPEED = 4
+LEADER_WEIGHT = 0.05
+
+
+def lengths(vectors):
+    return np.sqrt((vectors ** 2).sum(axis=-1))
+
+
+def set_length(vectors, length):
+    # Row-wise Vector2.scale_to_length; zero rows stay zero
+    norms = lengths(vectors)
+    scale = np.divide(length, norms, out=np.zeros_like(norms), where=norms > 0)
+    return vectors * scale[..., None]
+
+
+def limit(vectors, max_length):
+    norms = lengths(vectors)
+    scale = np.divide(max_length, norms, out=np.ones_like(norms), where=norms > max_length)
+    return vectors * scale[..., None]
+
+
+def steer(desired, velocities, speed=DESIRED_SPEED):
+    # Same steering as utils.seek: full speed towards desired, minus current velocity, capped at MAX_FORCE;
+    # no force where desired is zero
+    active = (desired ** 2).sum(axis=-1) > 0
+    force = limit(set_length(desired, speed) - velocities, MAX_FORCE)
+    return np.where(active[..., None], force, 0.0)
+
+
+def flee_forces(positions, predator_positions, index, groups=None):
+    # Flee acceleration of every boid from all predators in one pass: predators within PREDATOR_RANGE
+    # come from the neighbour index (built on positions), summed per boid in predator order.
+    # In an ensemble, groups gives each predator's replica (see neighbors.ReplicaIndex)
+    force = np.zeros_like(positions)
+    if groups is None:
+        p, j, away, distances = index.query(predator_positions, PREDATOR_RANGE)
+    else:
+        p, j, away, distances = index.query(predator_positions, PREDATOR_RANGE, groups)
+    order = np.lexsort((p, j))
+    j, away, distances = j[order], away[order], distances[order]
+    active = distances > 0
+    strength = np.divide(PREDATOR_RANGE - distances, PREDATOR_RANGE * distances,
+                         out=np.zeros_like(distances), where=active)
+    push = away * (strength * PREDATOR_STRENGTH)[:, None]
+    force[:, 0] = np.bincount(j, push[:, 0], minlength=len(positions))
+    force[:, 1] = np.bincount(j, push[:, 1], minlength=len(positions))
+    return force
+
+
+class FlockEngine:
+    def __init__(self, positions, velocities, width, height, index=None):
+        self.positions = np.ascontiguousarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.velocities = np.ascontiguousarray(velocities, dtype=np.float64).reshape(-1, 2)
+        self.width = width
+        self.height = height
+        self.index = index if index is not None else BruteForceIndex(width, height)
+        self.neighbors = None
+        self.profiler = None
+
+    @classmethod
+    def from_boids(cls, boids, width, height, index=None, **options):
+        engine = cls(np.zeros((len(boids), 2)), np.zeros((len(boids), 2)), width, height, index, **options)
+        engine.load(boids)
+        return engine
+
+    def __len__(self):
+        return len(self.positions)
+
+    def close(self):
+        pass
+
+    def resize(self, count):
+        self.positions = np.zeros((count, 2))
+        self.velocities = np.zeros((count, 2))
+
+    def set_state(self, positions, velocities):
+        # Copies (N, 2) positions and velocities into the engine's arrays, resizing them if N changed
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 2)
+        self.neighbors = None
+        if len(positions) != len(self.positions):
+            self.resize(len(positions))
+        self.positions[:] = positions
+        self.velocities[:] = velocities
+
+    def load(self, boids):
+        self.set_state([(boid.position.x, boid.position.y) for boid in boids],
+                       [(boid.velocity.x, boid.velocity.y) for boid in boids])
+
+    def store(self, boids):
+        for boid, position, velocity in zip(boids, self.positions.tolist(), self.velocities.tolist()):
+            boid.position.update(position)
+            boid.velocity.update(velocity)
+            boid.acceleration.update(0, 0)
+
+    def pairwise(self, radius=NEIGHBOR_DISTANCE):
+        # Sparse neighbour list (i, j, positions[i] - positions[j], distance) from the index
+        self.neighbors = self.index.pairs(self.positions, radius)
+        return self.neighbors
+
+    def flocking(self, sep_weight=1.0, ali_weight=1.0, coh_weight=1.0):
+        n = len(self.positions)
+        i, j, offsets, distances = self.neighbors if self.neighbors is not None else self.pairwise()
+        moved = distances > 0
+        if not moved.all():
+            i, j, offsets, distances = i[moved], j[moved], offsets[moved], distances[moved]
+
+        # Separation: mean of normalize(offset) / distance over close neighbours
+        close = distances < SEPARATION_DISTANCE
+        ci, push = i[close], offsets[close] / (distances[close] ** 2)[:, None]
+        counts = np.maximum(np.bincount(ci, minlength=n), 1)
+        push = np.stack([np.bincount(ci, push[:, 0], n), np.bincount(ci, push[:, 1], n)], axis=1)
+        sep = steer(push / counts[:, None], self.velocities)
+
+        # Alignment and cohesion share the same neighbourhood
+        near = distances < NEIGHBOR_DISTANCE
+        ni, nj, pull = (i, j, offsets) if near.all() else (i[near], j[near], offsets[near])
+        counts = np.maximum(np.bincount(ni, minlength=n), 1)[:, None]
+        heading = np.stack([np.bincount(ni, self.velocities[nj, 0], n),
+                            np.bincount(ni, self.velocities[nj, 1], n)], axis=1)
+        ali = steer(heading / counts, self.velocities)
+        # Centre of mass minus own position is minus the mean offset to the neighbours; like seek, no
+        # force when the centre of mass is exactly here (or there are no neighbours)
+        towards = -np.stack([np.bincount(ni, pull[:, 0], n), np.bincount(ni, pull[:, 1], n)], axis=1)
+        coh = steer(towards / counts, self.velocities)
+
+        return sep * sep_weight + ali * ali_weight + coh * coh_weight
+
+    def flee(self, predator_positions):
+        # One predator position or an (P, 2) array of them
+        if self.index.positions is not self.positions:
+            self.index.build(self.positions)
+        return flee_forces(self.positions, predator_positions, self.index)
+
+    def avoid(self, obstacle_positions, obstacle_sizes):
+        force = np.zeros_like(self.positions)
+        for center, size in zip(np.asarray(obstacle_positions, dtype=np.float64).reshape(-1, 2),
+                                np.asarray(obstacle_sizes, dtype=np.float64).ravel()):
+            away = self.positions - center
+            distances = lengths(away)
+            safe_distance = size + OBSTACLE_MARGIN
+            active = (distances > 0) & (distances < safe_distance)
+            strength = np.divide(safe_distance - distances, safe_distance * distances,
+                                 out=np.zeros_like(distances), where=active)
+            force += away * (strength * OBSTACLE_STRENGTH)[:, None]
+        return force
+
+    def follow(self, leader_index):
+        desired = self.positions[leader_index] - self.positions
+        force = steer(desired, self.velocities, speed=LEADER_SPEED) * LEADER_WEIGHT
+        force[leader_index] = 0.0
+        return force
+
+    def collisions(self, radius=COLLISION_DISTANCE):
+        if self.neighbors is None:
+            self.pairwise(radius)
+        i, j, _, distances = self.neighbors
+        return int(np.count_nonzero((i < j) & (distances < radius)))
+
+    def integrate(self, acceleration):
+        self.velocities = limit(self.velocities + acceleration, MAX_SPEED)
+        self.positions = self.positions + self.velocities
+        # Boid.wrap_around: jump to the opposite edge once outside the world
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        x[:] = np.where(x > self.width, 0.0, x)
+        x[:] = np.where(x < 0, self.width, x)
+        y[:] = np.where(y > self.height, 0.0, y)
+        y[:] = np.where(y < 0, self.height, y)
+        self.neighbors = None
+
+    def step(self, sep_weight=1.0, ali_weight=1.0, coh_weight=1.0,
+             predator_position=None, obstacle_positions=None, obstacle_sizes=None, leader_index=None,
+             obstacle_field=None):
+        # predator_position is one position or a (P, 2) array of them; an obstacles.ObstacleField
+        # takes the place of the obstacle position and size lists
+        if not len(self):
+            return 0
+        profiler = self.profiler
+        if profiler: lap = profiler.clock()
+        if self.neighbors is None:
+            self.pairwise()
+        if profiler: lap = profiler.lap("neighbors", lap)
+        acceleration = self.flocking(sep_weight, ali_weight, coh_weight)
+        if profiler: lap = profiler.lap("flocking", lap)
+        if predator_position is not None and len(predator_position):
+            acceleration += self.flee(predator_position)
+            if profiler: lap = profiler.lap("predator_flee", lap)
+        collisions = self.collisions()
+        if profiler: lap = profiler.lap("collisions", lap)
+        if obstacle_field is not None:
+            acceleration += obstacle_field.forces(self.positions)
+            if profiler: lap = profiler.lap("obstacles", lap)
+        elif obstacle_positions is not None and len(obstacle_positions):
+            acceleration += self.avoid(obstacle_positions, obstacle_sizes)
+            if profiler: lap = profiler.lap("obstacles", lap)
+        if leader_index is not None:
+            acceleration += self.follow(leader_index)
+            if profiler: lap = profiler.lap("leader", lap)
+        self.integrate(acceleration)
+        if profiler: profiler.lap("integration", lap)
+        return collisions
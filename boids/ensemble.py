@@ -0,0 +1,162 @@
+import numpy as np
+from .engine import FlockEngine, NEIGHBOR_DISTANCE, COLLISION_DISTANCE, flee_forces
+from .metrics import PAIR_METRICS, replica_metrics, replica_collisions
+from .neighbors import ReplicaIndex
+from .predators import PredatorSwarm
+
+
+class EnsembleEngine(FlockEngine):
+    # FlockEngine over the stacked boids of an ensemble: weights and leaders are given per boid, the
+    # neighbour index never pairs boids of different replicas and collisions are counted per replica
+    def __init__(self, positions, velocities, width, height, starts):
+        super().__init__(positions, velocities, width, height, ReplicaIndex(width, height, starts))
+        self.groups = self.index.groups
+        self.replicas = len(self.index.starts) - 1
+
+    def collisions(self, radius=COLLISION_DISTANCE):
+        if self.neighbors is None:
+            self.pairwise(radius)
+        return replica_collisions(self.neighbors, self.groups, self.replicas, radius)
+
+    def step(self, sep_weights, ali_weights, coh_weights, predators=(), obstacles=(), leaders=None):
+        # predators: PredatorSwarms with their groups set; obstacles: (field, rows) pairs, each field
+        # acting on the boids in rows; leaders: the leader of every boid's replica (itself if none).
+        # Returns the collision count of every replica
+        if self.neighbors is None:
+            self.pairwise()
+        acceleration = self.flocking(sep_weights, ali_weights, coh_weights)
+        for swarm in predators:
+            acceleration += flee_forces(self.positions, swarm.positions, self.index, swarm.groups)
+        collisions = self.collisions()
+        for field, rows in obstacles:
+            acceleration[rows] += field.forces(self.positions[rows])
+        if leaders is not None:
+            acceleration += self.follow(leaders)
+        self.integrate(acceleration)
+        return collisions
+
+
+class Ensemble:
+    # Many independent environments (replicas) stepped as one: their boids are stacked replica by
+    # replica into flat arrays and moved by a single EnsembleEngine with per-replica weights, so the
+    # Python work per step hardly grows with the number of replicas. Each replica keeps its own step
+    # counter, metrics log and convergence monitor, and moves exactly as it would on its own with
+    # backend="numpy" and neighbor_index="brute". Replicas that converge drop out of the ensemble.
+    # The environments' swarms and predators are only brought up to date by store() and close()
+    def __init__(self, envs):
+        envs = list(envs)
+        if not envs:
+            raise ValueError("An ensemble needs at least one environment")
+        self.width, self.height = envs[0].width, envs[0].height
+        if any((env.width, env.height) != (self.width, self.height) for env in envs):
+            raise ValueError("Every replica of an ensemble must have the same world size")
+        self.envs = envs
+        self.load(envs)
+
+    def __len__(self):
+        return len(self.active)
+
+    def load(self, envs):
+        self.active = envs
+        states = [env.swarm_state() for env in envs]
+        sizes = np.array([len(positions) for positions, _ in states], dtype=np.int64)
+        self.starts = np.concatenate([[0], np.cumsum(sizes)])
+        positions = np.concatenate([positions for positions, _ in states]).reshape(-1, 2)
+        velocities = np.concatenate([velocities for _, velocities in states]).reshape(-1, 2)
+        self.engine = EnsembleEngine(positions, velocities, self.width, self.height, self.starts)
+
+        def per_boid(values):
+            return np.repeat(np.array(values, dtype=np.float64), sizes)[:, None]
+        self.sep_weights = per_boid([env.separation_strength for env in envs])
+        self.ali_weights = per_boid([env.alignment_strength for env in envs])
+        self.coh_weights = per_boid([env.cohesion_strength for env in envs])
+        # A boid "following" itself feels no force, which stands in for a replica without a leader
+        self.leaders = np.arange(self.starts[-1])
+        for env, start, end in zip(envs, self.starts, self.starts[1:]):
+            if env.leader_index is not None:
+                self.leaders[start:end] = start + env.leader_index
+
+        # One stacked swarm per predator behaviour, remembering which rows belong to which replica
+        self.predators = []
+        for behavior in sorted({env.predators.behavior for env in envs if env.predators is not None}):
+            members = [(r, env) for r, env in enumerate(envs)
+                       if env.predators is not None and env.predators.behavior == behavior and len(env.predators)]
+            if not members:
+                continue
+            swarm = PredatorSwarm(np.concatenate([env.predators.positions for _, env in members]),
+                                  np.concatenate([env.predators.velocities for _, env in members]),
+                                  self.width, self.height, behavior)
+            swarm.groups = np.concatenate([np.full(len(env.predators), r) for r, env in members])
+            rows = np.cumsum([0] + [len(env.predators) for _, env in members])
+            self.predators.append((swarm, [(env, slice(a, b)) for (_, env), a, b in zip(members, rows, rows[1:])]))
+
+        # Replicas with the same obstacles share one obstacle field
+        fields = {}
+        for env, start, end in zip(envs, self.starts, self.starts[1:]):
+            key = (tuple((o.shape, o.position.x, o.position.y, o.size) for o in env.obstacles), env.obstacle_avoidance)
+            if key not in fields:
+                fields[key] = (env.obstacle_field(), [])
+            fields[key][1].append(np.arange(start, end))
+        self.obstacles = [(field, np.concatenate(rows)) for field, rows in fields.values()]
+        self.metric_names = sorted({name for env in envs for name in env.metrics.names})
+
+    def store(self):
+        # Copies the ensemble's state back into the environments' swarms and predators
+        engine = self.engine
+        for env, start, end in zip(self.active, self.starts, self.starts[1:]):
+            env.load_state(engine.positions[start:end], engine.velocities[start:end])
+        for swarm, members in self.predators:
+            for env, rows in members:
+                env.predators.positions[:] = swarm.positions[rows]
+                env.predators.velocities[:] = swarm.velocities[rows]
+                env.predators.targets = swarm.targets[rows].copy()
+
+    def close(self):
+        self.store()
+        for env in self.envs:
+            env.close()
+
+    def update(self):
+        # One step of every active replica, in the order of Environment.advance
+        envs, engine = self.active, self.engine
+        if not envs:
+            return
+        for env in envs:
+            if env.sink is None and env.log_file is not None:
+                env.open_log()
+
+        due = [env.metrics.due(env.step) for env in envs]
+        if any(due):
+            pairs = None
+            if PAIR_METRICS.intersection(self.metric_names):
+                # Pairs found for the metrics at these positions serve the flocking rules too
+                pairs = engine.neighbors = engine.index.pairs(engine.positions, NEIGHBOR_DISTANCE)
+            values = replica_metrics(self.metric_names, engine.positions, engine.velocities, engine.groups,
+                                     len(envs), pairs)
+            for r, env in enumerate(envs):
+                if due[r] and env.sink is not None:
+                    env.log([values[name][r].item() for name in env.metrics.names],
+                            engine.positions[self.starts[r]:self.starts[r + 1]])
+
+        for env in envs:
+            env.step += 1
+        for swarm, _ in self.predators:
+            if swarm.behavior == "chase":
+                swarm.move(engine.positions, engine.index)
+            else:
+                swarm.move()
+        collisions = engine.step(self.sep_weights, self.ali_weights, self.coh_weights,
+                                 [swarm for swarm, _ in self.predators], self.obstacles, self.leaders)
+        for env, count in zip(envs, collisions.tolist()):
+            env.collisions = count
+
+        if any(env.converged for env in envs):
+            self.store()
+            self.load([env for env in envs if not env.converged])
+
+    def run(self, steps):
+        # Up to `steps` steps; stops early once every replica has converged
+        for _ in range(steps):
+            if not self.active:
+                break
+            self.update()
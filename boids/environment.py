@@ -1,179 +1,503 @@
-import pygame
-import csv
+import io
 import os
 import math
-from boid import Boid
-
-class Obstacle:
-    def __init__(self, x, y, size, shape="circle"):
-        self.position = pygame.Vector2(x, y)
-        self.size = size
-        self.shape = shape
-
-    def draw(self, screen):
-        if self.shape == "circle":
-            pygame.draw.circle(screen, (255, 0, 0), (int(self.position.x), int(self.position.y)), self.size, width=2)
-        elif self.shape == "square":
-            rect = pygame.Rect(self.position.x - self.size/2, self.position.y - self.size/2, self.size, self.size)
-            pygame.draw.rect(screen, (255, 165, 0), rect, width=2)
-        elif self.shape == "triangle":
-            points = [
-                (self.position.x, self.position.y - self.size),
-                (self.position.x - self.size, self.position.y + self.size),
-                (self.position.x + self.size, self.position.y + self.size)
-            ]
-            pygame.draw.polygon(screen, (255, 255, 0), points, width=2)
+import random
+import numpy as np
+from .boid import Boid, MAX_SPEED, random_position, random_velocity
+from .utils import limit
+from .engine import FlockEngine, NEIGHBOR_DISTANCE, COLLISION_DISTANCE, PREDATOR_RANGE, PREDATOR_STRENGTH
+from .parallel import ParallelEngine
+from .neighbors import make_index
+from .obstacles import Obstacle, ObstacleField, load_obstacle_map
+from .predators import PredatorSwarm
+from .metrics import MetricsCollector, avg_distance_to_center, collision_count
+from .convergence import ConvergenceMonitor, CONVERGENCE_TOLERANCE
+from .metrics_sink import open_sink
+from .profiling import Profiler, profile_path
 
 class Environment:
     def __init__(self, width, height, num_boids,
-                 separation_strength=1.0, alignment_strength=1.0, cohesion_strength=1.0,with_predator=False, include_predator_column=False, log_file=None):
+                 separation_strength=1.0, alignment_strength=1.0, cohesion_strength=1.0,with_predator=False, include_predator_column=False, log_file=None,
+                 backend="python", neighbor_index="brute", seed=None, workers=None, metrics=None, metrics_every=1,
+                 obstacle_map=None, obstacle_avoidance="center", num_predators=1, predator_behavior="bounce",
+                 convergence_window=None, convergence_tolerance=CONVERGENCE_TOLERANCE):
         self.width = width
         self.height = height
         self.include_predator_column = include_predator_column
         self.with_predator = with_predator
-        self.boids = [Boid(width, height) for _ in range(num_boids)]
+        # All randomness goes through this generator, so a seed reproduces the whole run
+        self.seed = seed
+        self.rng = random.Random(seed)
+        if backend not in ("python", "numpy", "jit", "parallel"):
+            raise ValueError(f"Unknown backend: {backend}")
+        # The python backend moves Boid objects; the array backends keep the swarm in their engine's
+        # arrays only and make Boids of it just for drawing (see the boids property)
+        self.boid_list = None
+        self.views = None
+        state = np.zeros((0, 4))
+        if backend == "python":
+            self.boid_list = [Boid(width, height, rng=self.rng) for _ in range(num_boids)]
+        elif num_boids:
+            state = np.array([random_position(width, height, self.rng) + random_velocity(self.rng)
+                              for _ in range(num_boids)])
         self.obstacles = [
             Obstacle(width / 3, height / 3, 30, shape="circle"),
             Obstacle(2 * width / 3, 2 * height / 3, 40, shape="square"),
             Obstacle(width / 2, height / 4, 25, shape="triangle"),
             Obstacle(width / 2, 3 * height / 4, 35, shape="circle")
         ]
+        # A map file (see obstacles.load_obstacle_map) replaces the four default obstacles
+        if obstacle_map is not None:
+            self.obstacles = load_obstacle_map(obstacle_map)
+        # "center" keeps the original push away from obstacle centres, "sdf" avoids each shape's outline
+        self.obstacle_avoidance = obstacle_avoidance
+        self.field = None
+        self.obstacle_field()
 
         self.step = 0
         self.collisions = 0
-        self.leader = self.boids[0] if self.boids else None
-        # Initialize predator if enabled
+        # The leader is a boid index, the first boid unless there are none
+        self.leader_index = 0 if num_boids else None
+        # Predators, if enabled: num_predators of them, bouncing off the edges or chasing the nearest boid
+        self.predators = None
         if self.with_predator:
-            self.predator = Boid(width, height)
-            self.predator.color = (255, 0, 0)
-            self.predator.is_predator = True
-            self.predator.position = pygame.Vector2(0, height // 2)
-            self.predator.velocity = pygame.Vector2(2, 1.5)
+            self.predators = PredatorSwarm.spawn(num_predators, width, height, self.rng, predator_behavior)
 
         self.separation_strength = separation_strength
         self.alignment_strength = alignment_strength
         self.cohesion_strength = cohesion_strength
 
+        # "python" runs the per-boid Vector2 rules, "numpy" the batched FlockEngine, "jit" the same
+        # rules compiled by Numba into one parallel loop and "parallel" the FlockEngine split into
+        # tiles over `workers` processes (default: all cores)
+        if backend == "jit":
+            # Numba takes longer to import than everything else, so only this backend loads it
+            from .jit_engine import JitEngine, HAVE_NUMBA
+            if not HAVE_NUMBA:
+                print("[⚠] Numba is not installed, using the numpy backend instead of jit")
+                backend = "numpy"
+        self.backend = backend
+        self.neighbor_index = neighbor_index if isinstance(neighbor_index, str) else "brute"
+        # "brute" checks every pair, "grid" buckets boids into cells; an index object can be passed too
+        self.index = make_index(neighbor_index, width, height)
+        self.engine = None
+        if backend == "parallel":
+            self.engine = ParallelEngine(state[:, :2], state[:, 2:], width, height, self.index, workers=workers)
+        elif backend in ("numpy", "jit"):
+            engine_class = JitEngine if backend == "jit" else FlockEngine
+            self.engine = engine_class(state[:, :2], state[:, 2:], width, height, self.index)
+
         if log_file is None:
-            self.log_file = os.path.join(os.path.dirname(__file__), "results", "simulation_log_temp.csv")
+            self.log_file = os.path.join("results", "simulation_log_temp.csv")
         else:
             self.log_file = log_file
+        self.sink = None
+        # Logged swarm metrics (see metrics.METRICS), measured and written every `metrics_every` steps
+        self.metrics = MetricsCollector(metrics, metrics_every)
+        # Optional steady-state detection on the logged Avg Distance to Center and Collisions:
+        # self.converged turns True once their rolling means settle (see convergence.py)
+        self.convergence = None
+        if convergence_window:
+            self.convergence = ConvergenceMonitor(convergence_window, convergence_tolerance, metrics_every)
+        self.profiler = None
+        self.profile_export = False
+
+    def checkpoint(self):
+        # Compact binary snapshot (.npz) of everything needed to resume the simulation
+        state = {
+            "config": np.array([self.width, self.height, self.separation_strength,
+                                self.alignment_strength, self.cohesion_strength]),
+            "flags": np.array([self.with_predator, self.include_predator_column]),
+            "counters": np.array([self.step, self.collisions]),
+            "names": np.array([self.backend, self.neighbor_index]),
+            "boids": self.boid_state(),
+            "leader": np.array(-1 if self.leader_index is None else self.leader_index),
+            "obstacles": np.array([(o.position.x, o.position.y, o.size) for o in self.obstacles]).reshape(-1, 3),
+            "shapes": np.array([o.shape for o in self.obstacles], dtype=str),
+            "avoidance": np.array(self.obstacle_avoidance),
+        }
+        if self.predators is not None:
+            state["predators"] = np.hstack([self.predators.positions, self.predators.velocities])
+            state["predator_behavior"] = np.array(self.predators.behavior)
+        version, internal, gauss_next = self.rng.getstate()
+        state["rng"] = np.array(internal, dtype=np.uint64)
+        state["rng_extra"] = np.array([version, np.nan if gauss_next is None else gauss_next])
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **state)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_checkpoint(cls, data, **overrides):
+        # Keyword arguments override constructor settings, e.g. to fork variants with other weights
+        state = np.load(io.BytesIO(data), allow_pickle=False)
+        width, height, sep, ali, coh = state["config"].tolist()
+        with_predator, include_predator_column = state["flags"].tolist()
+        backend, neighbor_index = state["names"].tolist()
+        options = dict(separation_strength=sep, alignment_strength=ali, cohesion_strength=coh,
+                       with_predator=with_predator, include_predator_column=include_predator_column,
+                       backend=backend, neighbor_index=neighbor_index)
+        if "avoidance" in state:
+            options["obstacle_avoidance"] = str(state["avoidance"])
+        if "predators" in state:
+            options["num_predators"] = len(state["predators"])
+            options["predator_behavior"] = str(state["predator_behavior"])
+        options.update(overrides)
+        env = cls(width, height, 0, **options)
+
+        boids = state["boids"]
+        env.load_state(boids[:, :2], boids[:, 2:4], boids[:, 4:])
+        leader = int(state["leader"])
+        env.leader_index = leader if leader >= 0 else None
+        env.obstacles = [Obstacle(x, y, size, shape)
+                         for (x, y, size), shape in zip(state["obstacles"].tolist(), state["shapes"].tolist())]
+        # Checkpoints from before multiple predators hold a single "predator" row
+        if env.predators is not None and ("predators" in state or "predator" in state):
+            predators = (state["predators"] if "predators" in state else state["predator"]).reshape(-1, 4)
+            count = min(len(predators), len(env.predators))
+            env.predators.positions[:count] = predators[:count, :2]
+            env.predators.velocities[:count] = predators[:count, 2:]
+        env.step, env.collisions = (int(v) for v in state["counters"])
+        version, gauss_next = state["rng_extra"].tolist()
+        env.rng.setstate((int(version), tuple(int(v) for v in state["rng"]),
+                          None if math.isnan(gauss_next) else gauss_next))
+        return env
+
+    def save_checkpoint(self, path):
+        with open(path, "wb") as f:
+            f.write(self.checkpoint())
+
+    @classmethod
+    def load_checkpoint(cls, path, **overrides):
+        with open(path, "rb") as f:
+            return cls.from_checkpoint(f.read(), **overrides)
+
+    @property
+    def boids(self):
+        # The Boid objects of the python backend. On the array backends, Boids made from the engine's
+        # arrays when first asked for after a step, for drawing and inspection: changing them does not
+        # change the simulation (use load_state)
+        if self.engine is None:
+            return self.boid_list
+        if self.views is None:
+            self.views = [Boid(self.width, self.height, position=position, velocity=velocity)
+                          for position, velocity in zip(self.engine.positions.tolist(),
+                                                        self.engine.velocities.tolist())]
+        return self.views
+
+    @property
+    def num_boids(self):
+        return len(self.boid_list) if self.engine is None else len(self.engine)
+
+    @property
+    def leader(self):
+        return None if self.leader_index is None else self.boids[self.leader_index]
+
+    def boid_state(self):
+        # (N, 6) array of positions, velocities and accelerations (zero between steps on the array backends)
+        if self.engine is None:
+            return np.array([(b.position.x, b.position.y, b.velocity.x, b.velocity.y,
+                              b.acceleration.x, b.acceleration.y) for b in self.boid_list]).reshape(-1, 6)
+        return np.hstack([self.engine.positions, self.engine.velocities, np.zeros((len(self.engine), 2))])
+
+    def load_state(self, positions, velocities, accelerations=None):
+        # Replaces the swarm with the boids in (N, 2) arrays; the leader stays the same boid index
+        # if there still is one
+        if self.engine is None:
+            self.boid_list = [Boid(self.width, self.height, position=position, velocity=velocity)
+                              for position, velocity in zip(np.asarray(positions).tolist(),
+                                                            np.asarray(velocities).tolist())]
+            if accelerations is not None:
+                for boid, acceleration in zip(self.boid_list, np.asarray(accelerations).tolist()):
+                    boid.acceleration.update(acceleration)
+        else:
+            self.engine.set_state(positions, velocities)
+            self.views = None
+        count = self.num_boids
+        if self.leader_index is None or self.leader_index >= count:
+            self.leader_index = 0 if count else None
+
+    @property
+    def converged(self):
+        return self.convergence is not None and self.convergence.converged
+
+    def enable_profiling(self, export=True):
+        # Time every phase of update(); with export, per-step timings also go to profile_<log file>
+        self.profiler = Profiler()
+        self.profile_export = export
+        if self.engine is not None:
+            self.engine.profiler = self.profiler
+        return self.profiler
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.close()
+        self.profiler = None
+        if self.engine is not None:
+            self.engine.profiler = None
+
+    def close(self):
+        # Flush buffered metrics and close the log
+        if self.sink is not None:
+            self.sink.close()
+        if self.profiler is not None:
+            self.profiler.close()
+        if self.engine is not None:
+            self.engine.close()
+
+    def obstacle_field(self):
+        # Spatial index of the obstacles, rebuilt when self.obstacles is replaced or resized
+        # (call self.field = None after moving obstacles in place)
+        key = (id(self.obstacles), len(self.obstacles), self.obstacle_avoidance)
+        if self.field is None or self.field_key != key:
+            self.field = ObstacleField(self.obstacles, self.obstacle_avoidance)
+            self.field_key = key
+        return self.field
 
     def handle_manual_leader_control(self, keys_pressed):
-        if self.leader:
+        # keys_pressed is None when running headless
+        if self.leader_index is not None and keys_pressed is not None:
+            import pygame
+            # The leader's Vector2, or its row of the engine's positions, changed in place
+            if self.engine is None:
+                position = self.boid_list[self.leader_index].position
+            else:
+                position = self.engine.positions[self.leader_index]
+                self.views = None
             speed = 2.5
             if keys_pressed[pygame.K_UP]:
-                self.leader.position.y -= speed
+                position[1] -= speed
             if keys_pressed[pygame.K_DOWN]:
-                self.leader.position.y += speed
+                position[1] += speed
             if keys_pressed[pygame.K_LEFT]:
-                self.leader.position.x -= speed
+                position[0] -= speed
             if keys_pressed[pygame.K_RIGHT]:
-                self.leader.position.x += speed
+                position[0] += speed
 
-            if self.leader.position.x > self.width: self.leader.position.x = 0
-            if self.leader.position.x < 0: self.leader.position.x = self.width
-            if self.leader.position.y > self.height: self.leader.position.y = 0
-            if self.leader.position.y < 0: self.leader.position.y = self.height
+            if position[0] > self.width: position[0] = 0
+            if position[0] < 0: position[0] = self.width
+            if position[1] > self.height: position[1] = 0
+            if position[1] < 0: position[1] = self.height
+
+    def update(self, keys_pressed=None):
+        profiler = self.profiler
+        if profiler is None:
+            self.advance(keys_pressed)
+            return
 
-    def update(self, keys_pressed):
+        checks = self.index.checks
+        profiler.begin_step()
+        step = self.step
+        self.advance(keys_pressed)
+        profiler.count("neighbor_checks", self.index.checks - checks)
+        profiler.count("boids", self.num_boids)
+        if self.profile_export and profiler.sink is None and self.log_file is not None:
+            profiler.open(profile_path(self.log_file))
+        profiler.end_step(step)
+
+    def open_log(self):
+        headers = ["Step"] + self.metrics.names + ["Collisions"]
+        if self.include_predator_column:
+            headers.append("With Predator")
+        # Format follows the log file extension (.csv, .npyd, .parquet); rows are buffered until flushed
+        self.sink = open_sink(self.log_file, headers)
+
+    def log(self, values, positions):
+        # One row of the metrics log: values in self.metrics.names order, measured at positions
+        row = [self.step] + values + [self.collisions]
+        if self.include_predator_column:
+            row.append(int(self.with_predator))
+        self.sink.write(row)
+        if self.convergence is not None:
+            if "Avg Distance to Center" in self.metrics.names:
+                distance = values[self.metrics.names.index("Avg Distance to Center")]
+            else:
+                distance = avg_distance_to_center(positions)
+            self.convergence.observe(self.step, [distance, self.collisions])
+
+    def advance(self, keys_pressed):
+        # One simulation step; with profiling off the timers cost one truth test per phase
+        profiler = self.profiler
+        if profiler: lap = profiler.clock()
         self.handle_manual_leader_control(keys_pressed)
+        if profiler: lap = profiler.lap("leader_control", lap)
         if self.log_file is None:
             return
 
-        
-        # Write header only once at step 0
-        if self.step == 0:
-            headers = ["Step", "Avg Distance to Center", "Collisions"]
-            if self.include_predator_column:
-                headers.append("With Predator")
-            with open(self.log_file, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                self.handle_manual_leader_control(keys_pressed)
-
-        if not self.boids:
+        # Open the log (and write its header) only once, at the first step
+        if self.sink is None:
+            self.open_log()
+            self.handle_manual_leader_control(keys_pressed)
+
+        if not self.num_boids:
             return
 
-        center = pygame.Vector2(
-            sum(b.position.x for b in self.boids) / len(self.boids),
-            sum(b.position.y for b in self.boids) / len(self.boids)
-        )
-        avg_dist = sum(b.position.distance_to(center) for b in self.boids) / len(self.boids)
+        # Steps between samples skip the metrics entirely
+        positions = velocities = None
+        self.metrics.pairs = None
+        if self.metrics.due(self.step):
+            positions, velocities = self.swarm_state()
+            values = self.metrics.measure(positions, velocities, self.index)
+            if profiler: lap = profiler.lap("metrics", lap)
 
-        with open(self.log_file, "a", newline="") as f:
-            writer = csv.writer(f)
-            row = [self.step, avg_dist, self.collisions]
-            if self.include_predator_column:
-                row.append(int(self.with_predator))
-            writer.writerow(row)
+            self.log(values, positions)
+            if profiler: lap = profiler.lap("logging", lap)
 
         self.step += 1
-        # Update predator movement
-        if self.with_predator and hasattr(self, "predator"):
-            self.predator.position += self.predator.velocity
-            if self.predator.position.x <= 0 or self.predator.position.x >= self.width:
-                self.predator.velocity.x *= -1
-            if self.predator.position.y <= 0 or self.predator.position.y >= self.height:
-                self.predator.velocity.y *= -1
-            if self.predator.position.x > self.width:
-                self.predator.position.x = 0
+        # Update predator movement; chasing predators look up their nearest boid in the neighbour index
+        if self.predators is not None:
+            if self.predators.behavior == "chase":
+                if positions is None:
+                    positions, velocities = self.swarm_state()
+                self.predators.move(positions, self.index)
+            else:
+                self.predators.move()
         self.collisions = 0
+        if profiler: lap = profiler.lap("predator_move", lap)
 
-        for i, boid in enumerate(self.boids):
-            boid.apply_behavior(self.boids,
+        if self.engine is not None:
+            self.update_vectorized()
+            return
+
+        if positions is None:
+            positions, _ = self.swarm_state()
+        # Collision checks in the loop below would pair each boid with later, not yet moved boids,
+        # so they are all counted up front from the same positions
+        self.collisions = collision_count(self.metrics.pairs if self.metrics.pairs is not None
+                                          else self.index.pairs(positions, COLLISION_DISTANCE))
+        if profiler: lap = profiler.lap("collisions", lap)
+        # A boid's obstacle forces only depend on its own position, which does not change before its turn
+        field = self.obstacle_field()
+        obstacle_forces = field.forces(positions) if field.avoidance == "sdf" else None
+        if profiler: lap = profiler.lap("obstacles", lap)
+        # Boids move at most MAX_SPEED while the loop runs, so widen the queries by that much
+        self.index.build(positions)
+        if profiler: lap = profiler.lap("neighbors", lap)
+        # Like the obstacles, the flee force only depends on the boid's own position: the predators in
+        # range of every boid come from one batched query, the forces are still added boid by boid
+        near_predators = None
+        if self.predators is not None:
+            near_predators = self.predators_near()
+            if profiler: lap = profiler.lap("predator_flee", lap)
+        leader = self.leader_index
+        for i, boid in enumerate(self.boid_list):
+            nearby = self.nearby(boid, NEIGHBOR_DISTANCE + MAX_SPEED)
+            if profiler: lap = profiler.lap("neighbors", lap)
+            boid.apply_behavior(nearby,
                                 sep_weight=self.separation_strength,
                                 ali_weight=self.alignment_strength,
                                 coh_weight=self.cohesion_strength)
-            if self.with_predator and hasattr(self, "predator"):
-                distance = boid.position.distance_to(self.predator.position)
-                if distance < 100:
-                    away = boid.position - self.predator.position
-                    if away.length_squared() > 0:
-                        away = away.normalize()
-                        strength = (100 - distance) / 100
-                        boid.acceleration += away * strength * 2.0
-                        sep_weight=self.separation_strength,
-                        ali_weight=self.alignment_strength,
-                        coh_weight=self.cohesion_strength
-
-            for other_boid in self.boids[i+1:]:
-                if boid.position.distance_to(other_boid.position) < 5:
-                    self.collisions += 1
-
-            for obs in self.obstacles:
-                distance = boid.position.distance_to(obs.position)
-                safe_distance = obs.size + 30
-                if distance < safe_distance:
-                    away = boid.position - obs.position
-                    if away.length_squared() > 0:
-                        away = away.normalize()
-                        strength = (safe_distance - distance) / safe_distance
-                        boid.acceleration += away * strength * 1.5
-
-            if self.leader and boid != self.leader:
-                target = self.leader.position
-                desired = target - boid.position
-                if desired.length() > 0:
-                    desired.scale_to_length(4)
-                    steer = desired - boid.velocity
-                    if steer.length() > 0.05:
-                        steer.scale_to_length(0.05)
-                    boid.acceleration += steer * 0.05
+            if profiler: lap = profiler.lap("flocking", lap)
+            if near_predators is not None:
+                self.flee_predator(boid, near_predators[i])
+                if profiler: lap = profiler.lap("predator_flee", lap)
+
+            if obstacle_forces is None:
+                self.avoid_obstacles(boid)
+            else:
+                boid.acceleration.x += obstacle_forces[i, 0]
+                boid.acceleration.y += obstacle_forces[i, 1]
+            if profiler: lap = profiler.lap("obstacles", lap)
+
+            if leader is not None and i != leader:
+                self.follow_leader(boid)
+                if profiler: lap = profiler.lap("leader", lap)
 
             boid.update()
+            if profiler: lap = profiler.lap("integration", lap)
+
+    def swarm_state(self):
+        # (N, 2) position and velocity arrays of the boids as they are now; on the array backends these
+        # are the engine's own arrays, not copies
+        if self.engine is not None:
+            return self.engine.positions, self.engine.velocities
+        state = np.array([(b.position.x, b.position.y, b.velocity.x, b.velocity.y) for b in self.boid_list])
+        state = state.reshape(-1, 4)
+        return state[:, :2], state[:, 2:]
+
+    def update_vectorized(self):
+        # Same rules as the per-boid loop, but every boid steers from the same snapshot
+        self.views = None
+        # Pairs found for the metrics at these positions serve the flocking rules too
+        if self.metrics.pairs is not None:
+            self.engine.neighbors = self.metrics.pairs
+        self.collisions = self.engine.step(
+            self.separation_strength, self.alignment_strength, self.cohesion_strength,
+            predator_position=self.predators.positions if self.predators is not None else None,
+            obstacle_field=self.obstacle_field(),
+            leader_index=self.leader_index
+        )
+
+    def nearby(self, boid, radius, after=None):
+        # Candidate neighbours in list order, optionally only those after index `after`
+        found = self.index.candidates((boid.position.x, boid.position.y), radius)
+        boids = self.boid_list
+        if found is None:
+            return boids if after is None else boids[after+1:]
+        if after is not None:
+            found = found[found > after]
+        return [boids[k] for k in found]
+
+    # The per-boid rules below work on plain floats and add into boid.acceleration in place,
+    # so a step does not create a Vector2 per boid and rule
+    def predators_near(self):
+        # For every boid, the (x, y) of the predators within PREDATOR_RANGE of it in predator order,
+        # from one query on the neighbour index (built on the boids' current positions)
+        p, j, _, _ = self.index.query(self.predators.positions, PREDATOR_RANGE)
+        order = np.lexsort((p, j))
+        starts = np.searchsorted(j[order], np.arange(self.num_boids + 1)).tolist()
+        points = self.predators.positions[p[order]].tolist()
+        return [points[start:end] for start, end in zip(starts, starts[1:])]
+
+    def flee_predator(self, boid, predators=None):
+        # One boid against the predators given as (x, y), by default all of them. Kept to the arithmetic
+        # of the original rule, so the python backend moves exactly as before; the array backends use
+        # the batched engine.flee_forces
+        for px, py in self.predators.positions.tolist() if predators is None else predators:
+            away_x = boid.position.x - px
+            away_y = boid.position.y - py
+            distance = math.sqrt(away_x * away_x + away_y * away_y)
+            if 0 < distance < PREDATOR_RANGE:
+                strength = (PREDATOR_RANGE - distance) / PREDATOR_RANGE
+                boid.acceleration.x += away_x / distance * strength * PREDATOR_STRENGTH
+                boid.acceleration.y += away_y / distance * strength * PREDATOR_STRENGTH
+
+    def avoid_obstacles(self, boid):
+        # "center" rule over the obstacles listed in the boid's cell of the obstacle field
+        x, y = boid.position.x, boid.position.y
+        obstacles = self.obstacles
+        for k in self.obstacle_field().candidates(x, y):
+            obs = obstacles[k]
+            away_x, away_y = x - obs.position.x, y - obs.position.y
+            distance = math.sqrt(away_x * away_x + away_y * away_y)
+            safe_distance = obs.size + 30
+            if 0 < distance < safe_distance:
+                strength = (safe_distance - distance) / safe_distance
+                boid.acceleration.x += away_x / distance * strength * 1.5
+                boid.acceleration.y += away_y / distance * strength * 1.5
+
+    def follow_leader(self, boid):
+        desired_x = self.leader.position.x - boid.position.x
+        desired_y = self.leader.position.y - boid.position.y
+        length = math.sqrt(desired_x * desired_x + desired_y * desired_y)
+        if length > 0:
+            fraction = 4 / length
+            steer_x, steer_y = limit(desired_x * fraction - boid.velocity.x, desired_y * fraction - boid.velocity.y, 0.05)
+            boid.acceleration.x += steer_x * 0.05
+            boid.acceleration.y += steer_y * 0.05
 
     def draw(self, screen):
+        import pygame
         for obs in self.obstacles:
             obs.draw(screen)
 
-        for boid in self.boids:
-            if self.leader and boid == self.leader:
+        for i, boid in enumerate(self.boids):
+            if i == self.leader_index:
                 pulse = 6 + 2 * math.sin(pygame.time.get_ticks() * 0.005)
                 pygame.draw.circle(screen, (255, 0, 255), (int(boid.position.x), int(boid.position.y)), int(pulse))
             else:
                 boid.draw(screen)
 
-        # Draw predator as red circle
-        if self.with_predator and hasattr(self, "predator"):
-            pygame.draw.circle(screen, (255, 0, 0), (int(self.predator.position.x), int(self.predator.position.y)), 8)
+        # Draw predators as red circles
+        if self.predators is not None:
+            for x, y in self.predators.positions.tolist():
+                pygame.draw.circle(screen, (255, 0, 0), (int(x), int(y)), 8)
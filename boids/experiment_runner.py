@@ -1,12 +1,22 @@
-import pygame
+import argparse
 import time
-from environment import Environment
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .environment import Environment
+from .ensemble import Ensemble
+from .catalog import connect, record_run
+from .convergence import CONVERGENCE_TOLERANCE
+from .metrics import METRICS
+from .obstacles import AVOIDANCE_MODES
+from .predators import PREDATOR_BEHAVIORS
+from .profiling import profile_path
 import os
-import csv
 
 WIDTH, HEIGHT = 800, 600
 FPS = 60
 RUN_TIME = 20  # seconds
+STEPS = RUN_TIME * FPS  # headless runs: same length as a windowed run at full frame rate
+RESULTS_DIR = "results"  # relative to the working directory; --results-dir picks another
 
 # Parameter grid
 BOID_COUNTS = [30, 60]
@@ -17,28 +27,203 @@ WEIGHT_SETS = [
     (0.5, 2.0, 1.5)
 ]
 
-def run_experiment(num_boids, sep, ali, coh, with_predator):
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    clock = pygame.time.Clock()
+def experiment_label(num_boids, sep, ali, coh, with_predator):
+    return f"{num_boids}boids_sep{sep}_ali{ali}_coh{coh}{'_pred' if with_predator else ''}"
+
+def log_path(label, log_format=".csv", results_dir=RESULTS_DIR):
+    return os.path.join(results_dir, f"simulation_log_{label}{log_format}")
+
+def experiment_grid():
+    return [(num_boids, sep, ali, coh, pred)
+            for num_boids in BOID_COUNTS
+            for sep, ali, coh in WEIGHT_SETS
+            for pred in PREDATOR_STATES]
+
+def run_seed(base_seed, config):
+    # Stable per-config seed, independent of scheduling order
+    return (base_seed * 1000003 + zlib.crc32(experiment_label(*config).encode())) % 2**32
+
+def make_environment(config, backend="python", seed=None, log_format=".csv", results_dir=RESULTS_DIR, **options):
+    # Environment for one experiment config; options are further Environment settings
+    num_boids, sep, ali, coh, with_predator = config
     env = Environment(WIDTH, HEIGHT, num_boids,
                       separation_strength=sep,
                       alignment_strength=ali,
                       cohesion_strength=coh,
                       with_predator=with_predator,
-                      include_predator_column=True
+                      include_predator_column=True,
+                      backend=backend,
+                      seed=seed,
+                      **options
                       )
-    
-    # Customize output file name
-    label = f"{num_boids}boids_sep{sep}_ali{ali}_coh{coh}{'_pred' if with_predator else ''}"
-    env.log_file = os.path.join(os.path.dirname(__file__), "results", f"simulation_log_{label}.csv")
+    # Customize output file name; the log only gets its final name once the run is complete
+    env.log_file = log_path(experiment_label(*config), ".part" + log_format, results_dir)
+    return env
+
+def finish_run(env, config, wall_time, seed, log_format, steps, backend, results_dir=RESULTS_DIR, complete=True):
+    # Closes the run, gives its log the final name and describes it for the catalog. An incomplete run
+    # (window closed early) keeps its .part log, so a resumed sweep runs it again
+    num_boids, sep, ali, coh, with_predator = config
+    log_file = env.log_file
+    env.close()
+    if complete:
+        log_file = log_path(experiment_label(*config), log_format, results_dir)
+        os.replace(env.log_file, log_file)
+    result = {"log_file": log_file, "complete": complete, "steps": env.step, "wall_time": wall_time, "seed": seed,
+              "config": {"label": experiment_label(*config),
+                         "num_boids": num_boids, "separation": sep, "alignment": ali, "cohesion": coh,
+                         "with_predator": with_predator, "backend": backend}}
+    if env.convergence is not None:
+        result["converged_at"] = env.convergence.converged_at
+        result["steps_saved"] = max(steps - env.step, 0) if env.converged else 0
+    if with_predator:
+        result["config"].update(num_predators=len(env.predators), predator_behavior=env.predators.behavior)
+    return result
+
+def run_experiment(num_boids, sep, ali, coh, with_predator, headless=False, steps=STEPS, backend="python",
+                   seed=None, log_format=".csv", profile=False, metrics=None, metrics_every=1,
+                   obstacle_map=None, obstacle_avoidance="center", num_predators=1, predator_behavior="bounce",
+                   convergence_window=None, convergence_tolerance=CONVERGENCE_TOLERANCE, results_dir=RESULTS_DIR):
+    config = (num_boids, sep, ali, coh, with_predator)
+    env = make_environment(config, backend, seed, log_format, results_dir,
+                           metrics=metrics, metrics_every=metrics_every,
+                           obstacle_map=obstacle_map, obstacle_avoidance=obstacle_avoidance,
+                           num_predators=num_predators, predator_behavior=predator_behavior,
+                           convergence_window=convergence_window, convergence_tolerance=convergence_tolerance)
+    if profile:
+        env.enable_profiling()
+
+    start_time = time.time()
+    try:
+        if headless:
+            complete = run_headless(env, steps)
+        else:
+            complete = run_windowed(env, f"{num_boids}b sep={sep} ali={ali} coh={coh} "
+                                         f"pred={'ON' if with_predator else 'OFF'}")
+    finally:
+        # Also when the run fails: the parallel backend's workers and shared memory must not outlive it
+        # (finish_run closing it again is a no-op)
+        env.close()
+
+    # A windowed run lasts RUN_TIME, i.e. about STEPS steps at full frame rate
+    result = finish_run(env, config, time.time() - start_time, seed, log_format, steps if headless else STEPS,
+                        backend, results_dir, complete)
+    if profile:
+        os.replace(profile_path(env.log_file), profile_path(result["log_file"]))
+        result["profile"] = env.profiler.report()
+    return result
 
-    with open(env.log_file, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["Step", "Avg Distance to Center", "Collisions", "With Predator"])
+def run_ensemble(configs, steps=STEPS, base_seed=0, log_format=".csv", results_dir=RESULTS_DIR, **options):
+    # Headless runs of several configs as replicas of one Ensemble (numpy rules, brute-force neighbours);
+    # each still gets its own seed, log and result. Wall time is shared out by the steps each replica ran
+    envs = [make_environment(config, "numpy", run_seed(base_seed, config), log_format, results_dir, **options)
+            for config in configs]
+    start_time = time.time()
+    try:
+        ensemble = Ensemble(envs)
+        ensemble.run(steps)
+        ensemble.store()
+    finally:
+        for env in envs:
+            env.close()
+    wall_time = time.time() - start_time
+    total = sum(env.step for env in envs) or 1
+    return [finish_run(env, config, wall_time * env.step / total, env.seed, log_format, steps, "ensemble",
+                       results_dir)
+            for env, config in zip(envs, configs)]
+
+def run_sweep(configs, workers=None, steps=STEPS, backend="python", base_seed=0, resume=True, log_format=".csv",
+              profile=False, metrics=None, metrics_every=1, obstacle_map=None, obstacle_avoidance="center",
+              num_predators=1, predator_behavior="bounce", convergence_window=None,
+              convergence_tolerance=CONVERGENCE_TOLERANCE, ensemble=False, results_dir=RESULTS_DIR):
+    # Headless runs fanned out over a process pool; configs with a finished log are skipped when resuming.
+    # With ensemble, each worker steps its share of the configs together as one Ensemble instead
+    pending = [config for config in configs
+               if not (resume and os.path.exists(log_path(experiment_label(*config), log_format, results_dir)))]
+    skipped = len(configs) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} configs already in {results_dir}")
+    if ensemble and profile:
+        print("[⚠] Profiling is not available for ensembles, running without it")
+        profile = False
+
+    results = []
+    options = dict(metrics=metrics, metrics_every=metrics_every,
+                   obstacle_map=obstacle_map, obstacle_avoidance=obstacle_avoidance,
+                   num_predators=num_predators, predator_behavior=predator_behavior,
+                   convergence_window=convergence_window, convergence_tolerance=convergence_tolerance,
+                   results_dir=results_dir)
+    # Workers only write their logs; the catalog has a single writer, this process
+    db = connect(results_dir)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if ensemble:
+            count = min(workers or os.cpu_count() or 1, len(pending))
+            futures = {pool.submit(run_ensemble, pending[k::count], steps=steps, base_seed=base_seed,
+                                   log_format=log_format, **options): pending[k::count]
+                       for k in range(count)}
+        else:
+            futures = {pool.submit(run_experiment, *config, headless=True, steps=steps, backend=backend,
+                                   seed=run_seed(base_seed, config), log_format=log_format,
+                                   profile=profile, **options): [config]
+                       for config in pending}
+        for future in as_completed(futures):
+            try:
+                batch = future.result()
+            except Exception as exc:
+                for config in futures[future]:
+                    print(f"[⚠] {experiment_label(*config)} failed: {exc}")
+                continue
+            for result in batch if ensemble else [batch]:
+                results.append(result)
+                catalog_result(db, result, results_dir)
+                converged = f", converged at step {result['converged_at']}" if result.get("converged_at") is not None else ""
+                print(f"Finished {result['config']['label']}: {result['steps']} steps in {result['wall_time']:.2f}s"
+                      f"{converged} ({len(results)}/{len(pending)})")
+                if profile:
+                    print_profile(result["profile"])
+    db.close()
+    if convergence_window:
+        print_convergence(results, steps)
+    return results
+
+def catalog_result(db, result, results_dir=RESULTS_DIR):
+    record_run(db, results_dir, result["log_file"], seed=result["seed"], steps=result["steps"],
+               wall_time=result["wall_time"], **result["config"])
+
+def print_profile(report):
+    rows, counters = report
+    for row in rows:
+        print(f"    {row['phase']:<16} {row['mean_ms']:8.3f} ms/step  {row['share']:6.1%}")
+    for name, value in counters.items():
+        print(f"    {name:<16} {value:8.0f} per step")
+
+def print_convergence(results, steps):
+    saved = sum(result.get("steps_saved", 0) for result in results)
+    converged = sum(result.get("converged_at") is not None for result in results)
+    planned = steps * len(results)
+    print(f"Convergence: {converged}/{len(results)} runs stopped early, {saved} of {planned} steps saved "
+          f"({saved / planned if planned else 0:.1%})")
 
+def run_headless(env, steps):
+    # No display, fonts or event pumping: `steps` updates as fast as the CPU allows,
+    # or fewer once the convergence monitor (if any) sees a steady state. Always runs to completion
+    for _ in range(steps):
+        env.update()
+        if env.converged:
+            break
+    return True
+
+def run_windowed(env, config_text):
+    # Only windowed runs use pygame directly. True once RUN_TIME is up or the run converged,
+    # False if the window was closed first
+    import pygame
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont(None, 28)
     start_time = time.time()
     running = True
+    complete = False
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -50,26 +235,91 @@ def run_experiment(num_boids, sep, ali, coh, with_predator):
         env.draw(screen)
 
         # Draw experiment configuration overlay
-        font = pygame.font.SysFont(None, 28)
-        config_text = f"{num_boids}b sep={sep} ali={ali} coh={coh} pred={'ON' if with_predator else 'OFF'}"
         overlay = font.render(config_text, True, (255, 255, 255))
         screen.blit(overlay, (20, 20))
         pygame.display.flip()
         clock.tick(FPS)
 
-        if time.time() - start_time > RUN_TIME:
+        if time.time() - start_time > RUN_TIME or env.converged:
             running = False
+            complete = True
 
     pygame.quit()
+    return complete
 
-if __name__ == "__main__":
-    for num_boids in BOID_COUNTS:
-        for sep, ali, coh in WEIGHT_SETS:
-            for pred in PREDATOR_STATES:
-                print(f"Running: {num_boids} boids, sep={sep}, ali={ali}, coh={coh}, predator={pred}")
-                run_experiment(num_boids, sep, ali, coh, pred)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the boids experiment grid.")
+    parser.add_argument("--headless", action="store_true",
+                        help="no window, run a fixed number of steps as fast as possible")
+    parser.add_argument("--steps", type=int, default=STEPS,
+                        help=f"steps per run in headless mode (default {STEPS})")
+    parser.add_argument("--backend", choices=["python", "numpy", "jit", "parallel"], default="python",
+                        help="jit needs numba and falls back to numpy without it; parallel splits each "
+                             "step over worker processes and is meant for very large swarms")
+    parser.add_argument("--ensemble", action="store_true",
+                        help="headless: step each worker's configs together as one ensemble (numpy rules, "
+                             "brute-force neighbours), much faster for many small swarms")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parallel worker processes for headless sweeps (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="base seed; each config derives its own")
+    parser.add_argument("--force", action="store_true", help="re-run configs that already have results")
+    parser.add_argument("--results-dir", default=RESULTS_DIR,
+                        help=f"directory for the logs and the run catalog (default: ./{RESULTS_DIR})")
+    parser.add_argument("--log-format", choices=[".csv", ".npyd", ".parquet"], default=".csv",
+                        help="metrics log format: CSV text, .npy column chunks, or Parquet (needs pyarrow)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each phase of the update and log it to <results-dir>/profile_<log>")
+    parser.add_argument("--metrics", nargs="+", choices=METRICS, default=None, metavar="METRIC",
+                        help=f"metrics to log (default: Avg Distance to Center); any of: {', '.join(METRICS)}")
+    parser.add_argument("--metrics-every", type=int, default=1,
+                        help="log the metrics every N steps instead of every step")
+    parser.add_argument("--obstacle-map", default=None,
+                        help="obstacle map file (.csv or .json, see obstacles.py) instead of the four default obstacles")
+    parser.add_argument("--obstacle-avoidance", choices=AVOIDANCE_MODES, default="center",
+                        help="center: push away from obstacle centres (original rule); sdf: avoid each shape's outline")
+    parser.add_argument("--predators", type=int, default=1,
+                        help="number of predators in the configs that have one (default 1)")
+    parser.add_argument("--predator-behavior", choices=PREDATOR_BEHAVIORS, default="bounce",
+                        help="bounce: fly straight and bounce off the edges (original); chase: hunt the nearest boid")
+    parser.add_argument("--convergence-window", type=int, default=None, metavar="STEPS",
+                        help="end a run early once the rolling means of Avg Distance to Center and Collisions "
+                             "over two consecutive windows of this many steps agree (default: off)")
+    parser.add_argument("--convergence-tolerance", type=float, default=CONVERGENCE_TOLERANCE,
+                        help=f"largest relative change between the two window means (default {CONVERGENCE_TOLERANCE})")
+    return parser.parse_args()
 
-    print("All experiments complete. Check 'results/' folder.")
-    
+def main():
+    args = parse_args()
+    if args.headless:
+        run_sweep(experiment_grid(), workers=args.workers, steps=args.steps, backend=args.backend,
+                  base_seed=args.seed, resume=not args.force, log_format=args.log_format,
+                  profile=args.profile, metrics=args.metrics, metrics_every=args.metrics_every,
+                  obstacle_map=args.obstacle_map, obstacle_avoidance=args.obstacle_avoidance,
+                  num_predators=args.predators, predator_behavior=args.predator_behavior,
+                  convergence_window=args.convergence_window, convergence_tolerance=args.convergence_tolerance,
+                  ensemble=args.ensemble, results_dir=args.results_dir)
+    else:
+        db = connect(args.results_dir)
+        for num_boids, sep, ali, coh, pred in experiment_grid():
+            print(f"Running: {num_boids} boids, sep={sep}, ali={ali}, coh={coh}, predator={pred}")
+            result = run_experiment(num_boids, sep, ali, coh, pred, backend=args.backend,
+                                    seed=run_seed(args.seed, (num_boids, sep, ali, coh, pred)),
+                                    log_format=args.log_format, profile=args.profile,
+                                    metrics=args.metrics, metrics_every=args.metrics_every,
+                                    obstacle_map=args.obstacle_map, obstacle_avoidance=args.obstacle_avoidance,
+                                    num_predators=args.predators, predator_behavior=args.predator_behavior,
+                                    convergence_window=args.convergence_window,
+                                    convergence_tolerance=args.convergence_tolerance,
+                                    results_dir=args.results_dir)
+            if result["complete"]:
+                catalog_result(db, result, args.results_dir)
+            else:
+                print(f"[⚠] Window closed early, {result['log_file']} is left unfinished and not catalogued")
+            if args.profile:
+                print_profile(result["profile"])
+        db.close()
 
+    print(f"All experiments complete. Check '{args.results_dir}/' folder.")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import math
+import os
+import numpy as np
+from .boid import MAX_SPEED, MAX_FORCE
+from .engine import (FlockEngine, DESIRED_SPEED, SEPARATION_DISTANCE, NEIGHBOR_DISTANCE, COLLISION_DISTANCE,
+                    PREDATOR_RANGE, PREDATOR_STRENGTH, OBSTACLE_MARGIN, OBSTACLE_STRENGTH, LEADER_SPEED,
+                    LEADER_WEIGHT)
+from .neighbors import GridIndex
+from .obstacles import Obstacle, ObstacleField
+
+# Numba is optional: without it Environment(backend="jit") falls back to the NumPy engine
+try:
+    import numba
+    HAVE_NUMBA = True
+    prange = numba.prange
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+    prange = range
+
+# Once the kernel has run on TBB threads, a process that forks (a headless sweep, the parallel backend)
+# hangs at exit, so OpenMP and the workqueue come first unless NUMBA_THREADING_LAYER(_PRIORITY) says otherwise
+if HAVE_NUMBA and "NUMBA_THREADING_LAYER_PRIORITY" not in os.environ:
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "workqueue", "tbb"]
+
+
+def steer_one(dx, dy, vx, vy, speed):
+    # utils.seek on one boid: full speed towards (dx, dy), minus velocity, capped at MAX_FORCE
+    norm = math.sqrt(dx * dx + dy * dy)
+    if norm > 0:
+        dx, dy = dx * speed / norm, dy * speed / norm
+    fx, fy = dx - vx, dy - vy
+    norm = math.sqrt(fx * fx + fy * fy)
+    if norm > MAX_FORCE:
+        fx, fy = fx * MAX_FORCE / norm, fy * MAX_FORCE / norm
+    return fx, fy
+
+
+def push_away(x, y, cx, cy, reach, strength):
+    # Environment.avoid_obstacles: away from (cx, cy), stronger the closer it is
+    ax, ay = x - cx, y - cy
+    distance = math.sqrt(ax * ax + ay * ay)
+    if 0 < distance < reach:
+        scale = (reach - distance) / (reach * distance) * strength
+        return ax * scale, ay * scale
+    return 0.0, 0.0
+
+
+def sign(value):
+    # np.sign on a float: zero stays zero
+    if value > 0:
+        return 1.0
+    if value < 0:
+        return -1.0
+    return 0.0
+
+
+def outline_distance(ox, oy, size, kind):
+    # obstacles.circle/square/triangle_distance on one offset from the obstacle centre: signed distance
+    # to the outline (negative inside) and the outward normal
+    if kind == 0:
+        distance = math.sqrt(ox * ox + oy * oy)
+        if distance > 0:
+            return distance - size, ox / distance, oy / distance
+        return distance - size, 0.0, 0.0
+    if kind == 1:
+        qx, qy = abs(ox) - size / 2, abs(oy) - size / 2
+        outside_x, outside_y = max(qx, 0.0), max(qy, 0.0)
+        outside = math.sqrt(outside_x * outside_x + outside_y * outside_y)
+        if outside > 0:
+            nx, ny = sign(ox) * (outside_x / outside), sign(oy) * (outside_y / outside)
+        elif qx > qy:
+            nx, ny = sign(ox), 0.0
+        else:
+            nx, ny = 0.0, sign(oy)
+        return outside + min(max(qx, qy), 0.0), nx, ny
+    # Triangle with corners (0, -size), (-size, size), (size, size)
+    corners_x = (0.0, -size, size)
+    corners_y = (-size, size, size)
+    nearest_x = nearest_y = 0.0
+    nearest = -1.0
+    positive = negative = 0
+    for k in range(3):
+        sx, sy = corners_x[k], corners_y[k]
+        ex, ey = corners_x[(k + 1) % 3] - sx, corners_y[(k + 1) % 3] - sy
+        tx, ty = ox - sx, oy - sy
+        t = min(max((tx * ex + ty * ey) / (ex * ex + ey * ey), 0.0), 1.0)
+        awx, awy = tx - ex * t, ty - ey * t
+        length = math.sqrt(awx * awx + awy * awy)
+        if nearest < 0 or length < nearest:
+            nearest_x, nearest_y, nearest = awx, awy, length
+        side = ex * ty - ey * tx
+        positive += side >= 0
+        negative += side <= 0
+    nx = ny = 0.0
+    if nearest > 0:
+        nx, ny = nearest_x / nearest, nearest_y / nearest
+    if positive == 3 or negative == 3:
+        return -nearest, -nx, -ny
+    return nearest, nx, ny
+
+
+def fused_step(positions, velocities, order, starts, cols, rows, cell_width, cell_height, steps_x, steps_y,
+               width, height, periodic, sep_weight, ali_weight, coh_weight, predators, predator_order,
+               predator_starts, predator_steps_x, predator_steps_y, field_x, field_y, field_cell, field_cols,
+               field_rows, field_entries, field_starts, centers, reach, sizes, kinds, sdf, leader,
+               new_positions, new_velocities, collisions, checks):
+    # One pass per boid: neighbour search, every force term and the integration, reading only the old state.
+    # The predators are bucketed into the same cells as the boids; the obstacles come from an
+    # obstacles.ObstacleField's cell lists
+    for i in prange(len(positions)):
+        x, y = positions[i, 0], positions[i, 1]
+        vx, vy = velocities[i, 0], velocities[i, 1]
+        cx = int(math.floor(x / cell_width)) % cols
+        cy = int(math.floor(y / cell_height)) % rows
+        sep_x = sep_y = ali_x = ali_y = coh_x = coh_y = 0.0
+        close = near = hits = seen = 0
+        for dx in steps_x:
+            for dy in steps_y:
+                cell = (cx + dx) % cols * rows + (cy + dy) % rows
+                for k in range(starts[cell], starts[cell + 1]):
+                    j = order[k]
+                    if j == i:
+                        continue
+                    seen += 1
+                    ox, oy = x - positions[j, 0], y - positions[j, 1]
+                    if periodic:
+                        ox -= width * np.rint(ox / width)
+                        oy -= height * np.rint(oy / height)
+                    distance = math.sqrt(ox * ox + oy * oy)
+                    if distance < COLLISION_DISTANCE and j > i:
+                        hits += 1
+                    if distance <= 0 or distance >= NEIGHBOR_DISTANCE:
+                        continue
+                    near += 1
+                    ali_x += velocities[j, 0]
+                    ali_y += velocities[j, 1]
+                    coh_x -= ox
+                    coh_y -= oy
+                    if distance < SEPARATION_DISTANCE:
+                        close += 1
+                        sep_x += ox / (distance * distance)
+                        sep_y += oy / (distance * distance)
+
+        ax = ay = 0.0
+        if close:
+            sep_x, sep_y = sep_x / close, sep_y / close
+        if sep_x != 0 or sep_y != 0:
+            fx, fy = steer_one(sep_x, sep_y, vx, vy, DESIRED_SPEED)
+            ax, ay = ax + fx * sep_weight, ay + fy * sep_weight
+        if near:
+            ali_x, ali_y = ali_x / near, ali_y / near
+            if ali_x != 0 or ali_y != 0:
+                fx, fy = steer_one(ali_x, ali_y, vx, vy, DESIRED_SPEED)
+                ax, ay = ax + fx * ali_weight, ay + fy * ali_weight
+            coh_x, coh_y = coh_x / near, coh_y / near
+            if coh_x != 0 or coh_y != 0:
+                fx, fy = steer_one(coh_x, coh_y, vx, vy, DESIRED_SPEED)
+                ax, ay = ax + fx * coh_weight, ay + fy * coh_weight
+
+        # engine.flee_forces: every predator within PREDATOR_RANGE, summed before it is added
+        if len(predators):
+            flee_x = flee_y = 0.0
+            for dx in predator_steps_x:
+                for dy in predator_steps_y:
+                    cell = (cx + dx) % cols * rows + (cy + dy) % rows
+                    for k in range(predator_starts[cell], predator_starts[cell + 1]):
+                        p = predator_order[k]
+                        seen += 1
+                        away_x, away_y = x - predators[p, 0], y - predators[p, 1]
+                        if periodic:
+                            away_x -= width * np.rint(away_x / width)
+                            away_y -= height * np.rint(away_y / height)
+                        distance = math.sqrt(away_x * away_x + away_y * away_y)
+                        if 0 < distance < PREDATOR_RANGE:
+                            scale = (PREDATOR_RANGE - distance) / (PREDATOR_RANGE * distance) * PREDATOR_STRENGTH
+                            flee_x, flee_y = flee_x + away_x * scale, flee_y + away_y * scale
+            ax, ay = ax + flee_x, ay + flee_y
+
+        # ObstacleField.forces: only the obstacles listed in the boid's own cell, in obstacle order
+        fcx = math.floor((x - field_x) / field_cell)
+        fcy = math.floor((y - field_y) / field_cell)
+        if 0 <= fcx < field_cols and 0 <= fcy < field_rows:
+            cell = int(fcx) * field_rows + int(fcy)
+            avoid_x = avoid_y = 0.0
+            for k in range(field_starts[cell], field_starts[cell + 1]):
+                o = field_entries[k]
+                if sdf:
+                    distance, nx, ny = outline_distance(x - centers[o, 0], y - centers[o, 1], sizes[o], kinds[o])
+                    scale = max(OBSTACLE_MARGIN - distance, 0.0) / OBSTACLE_MARGIN * OBSTACLE_STRENGTH
+                    fx, fy = nx * scale, ny * scale
+                else:
+                    fx, fy = push_away(x, y, centers[o, 0], centers[o, 1], reach[o], OBSTACLE_STRENGTH)
+                avoid_x, avoid_y = avoid_x + fx, avoid_y + fy
+            ax, ay = ax + avoid_x, ay + avoid_y
+
+        if leader >= 0 and leader != i:
+            lx, ly = positions[leader, 0] - x, positions[leader, 1] - y
+            if lx != 0 or ly != 0:
+                fx, fy = steer_one(lx, ly, vx, vy, LEADER_SPEED)
+                ax, ay = ax + fx * LEADER_WEIGHT, ay + fy * LEADER_WEIGHT
+
+        # FlockEngine.integrate
+        vx, vy = vx + ax, vy + ay
+        speed = math.sqrt(vx * vx + vy * vy)
+        if speed > MAX_SPEED:
+            vx, vy = vx * MAX_SPEED / speed, vy * MAX_SPEED / speed
+        x, y = x + vx, y + vy
+        if x > width:
+            x = 0.0
+        if x < 0:
+            x = width
+        if y > height:
+            y = 0.0
+        if y < 0:
+            y = height
+        new_positions[i, 0], new_positions[i, 1] = x, y
+        new_velocities[i, 0], new_velocities[i, 1] = vx, vy
+        collisions[i] = hits
+        checks[i] = seen
+
+
+if HAVE_NUMBA:
+    steer_one = numba.njit(steer_one)
+    push_away = numba.njit(push_away)
+    sign = numba.njit(sign)
+    outline_distance = numba.njit(outline_distance)
+    fused_step = numba.njit(parallel=True, cache=True)(fused_step)
+
+
+class JitEngine(FlockEngine):
+    # FlockEngine whose step runs as one compiled loop over boids (CPU threads via numba.prange)
+    def __init__(self, positions, velocities, width, height, index=None):
+        if not HAVE_NUMBA:
+            raise ImportError("The jit backend needs numba: pip install numba")
+        super().__init__(positions, velocities, width, height, index)
+
+    def steps(self, radius):
+        # Cell offsets along x and y that cover radius, or the single cell for other indexes
+        if isinstance(self.index, GridIndex):
+            steps = self.index.steps(radius)
+            return (np.array(sorted({dx for dx, _ in steps}), dtype=np.int64),
+                    np.array(sorted({dy for _, dy in steps}), dtype=np.int64))
+        zero = np.zeros(1, dtype=np.int64)
+        return zero, zero
+
+    def cells(self):
+        # The grid index's cell list, or one cell holding every boid for other indexes
+        if isinstance(self.index, GridIndex):
+            self.index.build(self.positions)
+            return (self.index.order, self.index.starts, self.index.cols, self.index.rows,
+                    self.index.cell_width, self.index.cell_height, *self.steps(NEIGHBOR_DISTANCE))
+        return (np.arange(len(self), dtype=np.int64), np.array([0, len(self)], dtype=np.int64), 1, 1,
+                float(self.width), float(self.height), *self.steps(NEIGHBOR_DISTANCE))
+
+    def predator_cells(self, predator_positions, cols, rows, cell_width, cell_height):
+        # The predators sorted into the boids' cells, in predator order within each cell
+        points = np.asarray(predator_positions if predator_positions is not None else (),
+                            dtype=np.float64).reshape(-1, 2)
+        cells = (np.floor_divide(points[:, 0], cell_width).astype(np.int64) % cols * rows
+                 + np.floor_divide(points[:, 1], cell_height).astype(np.int64) % rows)
+        starts = np.zeros(cols * rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=cols * rows), out=starts[1:])
+        return (points, np.argsort(cells, kind="stable"), starts, *self.steps(PREDATOR_RANGE))
+
+    def step(self, sep_weight=1.0, ali_weight=1.0, coh_weight=1.0,
+             predator_position=None, obstacle_positions=None, obstacle_sizes=None, leader_index=None,
+             obstacle_field=None):
+        if not len(self):
+            return 0
+        profiler = self.profiler
+        if profiler: lap = profiler.clock()
+        # Obstacle position and size lists become a field of circles with the original centre rule
+        field = obstacle_field
+        if field is None:
+            centers = np.asarray(obstacle_positions if obstacle_positions is not None else (),
+                                 dtype=np.float64).reshape(-1, 2).tolist()
+            sizes = obstacle_sizes if obstacle_sizes is not None else ()
+            field = ObstacleField([Obstacle(x, y, size) for (x, y), size in zip(centers, sizes)])
+        cells = self.cells()
+        predators = self.predator_cells(predator_position, *cells[2:6])
+        if profiler: lap = profiler.lap("neighbors", lap)
+        new_positions = np.empty_like(self.positions)
+        new_velocities = np.empty_like(self.velocities)
+        collisions = np.empty(len(self), dtype=np.int64)
+        checks = np.empty(len(self), dtype=np.int64)
+        fused_step(self.positions, self.velocities, *cells, float(self.width), float(self.height),
+                   bool(getattr(self.index, "periodic", False)), float(sep_weight), float(ali_weight),
+                   float(coh_weight), *predators, float(field.origin[0]), float(field.origin[1]),
+                   float(field.cell_size), int(field.cols), int(field.rows), field.entries, field.starts,
+                   field.centers, field.reach, field.sizes, field.kinds,
+                   field.avoidance == "sdf", -1 if leader_index is None else leader_index,
+                   new_positions, new_velocities, collisions, checks)
+        self.positions = new_positions
+        self.velocities = new_velocities
+        self.neighbors = None
+        self.index.checks += int(checks.sum())
+        if profiler: profiler.lap("fused", lap)
+        return int(collisions.sum())
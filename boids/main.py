@@ -1,53 +1,124 @@
 import pygame
 import random
 import math
-from boid import Boid
-from environment import Environment
+import os
+import time
+from .boid import Boid
+from .environment import Environment
+from .renderer import SpriteRenderer, TextCache, swarm_arrays, interpolate
+from .recorder import FrameRecorder
 
 WIDTH, HEIGHT = 800, 600
 NUM_BOIDS = 30
 FPS = 60
+SIM_RATE = 60  # simulation steps per second of real time at 1x speed
+MAX_STEPS_PER_FRAME = 10  # cap on catch-up steps so a slow frame cannot snowball
+SPEEDS = [1, 2, 4, 8]
+RENDER_EVERY = [1, 2, 4, 8]
 
-pygame.init()
-#screen resolution for fullscreen
-info = pygame.display.Info()
-width, height = info.current_w, info.current_h
-screen = pygame.display.set_mode((width, height), pygame.FULLSCREEN)
-
-# Hide mouse
-pygame.mouse.set_visible(False)
-
-# Create simulation environment
-env = Environment(width, height, num_boids=30, with_predator=True)
-env.include_predator_column = True
-# Clock for frame control
-clock = pygame.time.Clock()
-running = True
-
-while running:
-    screen.fill((0, 0, 0))
-    font = pygame.font.SysFont(None, 20)
-    info_lines = [
-        "Simulation Mode: Manual Demo",
-        f"Boid Count: {len(env.boids)}",
-        "Leader Control: Arrow Keys",
-        f"Predator: {'On' if env.with_predator else 'Off'}",
-        f"Logging: {env.log_file.split('/')[-1]}"
-    ]
-
-    for i, line in enumerate(info_lines):
-        text = font.render(line, True, (255, 255, 255))
-        screen.blit(text, (10, 10 + i * 20))
-
-    keys = pygame.key.get_pressed()
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT or keys[pygame.K_ESCAPE]:
-            running = False
-
-    env.update(keys)
-    env.draw(screen)
-    pygame.display.flip()
-    clock.tick(60)  # 60 FPS for smoother video
-
-pygame.quit()
\ No newline at end of file
+
+def main():
+    pygame.init()
+    #screen resolution for fullscreen
+    info = pygame.display.Info()
+    width, height = info.current_w, info.current_h
+    screen = pygame.display.set_mode((width, height), pygame.FULLSCREEN)
+
+    # Hide mouse
+    pygame.mouse.set_visible(False)
+
+    # Create simulation environment
+    env = Environment(width, height, num_boids=30, with_predator=True)
+    env.include_predator_column = True
+    # Batched sprite rendering; env.draw(screen) draws the same scene one polygon at a time
+    renderer = SpriteRenderer()
+    hud = TextCache(20)
+    # Clock for frame control
+    clock = pygame.time.Clock()
+    running = True
+
+    # Fixed-timestep simulation: real time accumulates and is spent in whole steps of 1 / SIM_RATE,
+    # independent of how fast frames are drawn
+    step_time = 1 / SIM_RATE
+    accumulator = 0.0
+    speed = 0
+    render_every = 0
+    frame = 0
+    previous, _ = swarm_arrays(env)
+    previous = previous.copy()
+    # V toggles recording of the drawn frames to results/recording_<time>/ (see record.py for offscreen recording)
+    recorder = None
+
+    while running:
+        frame_time = min(clock.tick(FPS) / 1000, MAX_STEPS_PER_FRAME * step_time)
+        accumulator += frame_time * SPEEDS[speed]
+
+        keys = pygame.key.get_pressed()
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or keys[pygame.K_ESCAPE]:
+                running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                if env.profiler is None:
+                    env.enable_profiling()
+                else:
+                    env.disable_profiling()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_s:
+                speed = (speed + 1) % len(SPEEDS)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                render_every = (render_every + 1) % len(RENDER_EVERY)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_v:
+                if recorder is None:
+                    folder = os.path.join("results", f"recording_{time.strftime('%Y%m%d_%H%M%S')}")
+                    recorder = FrameRecorder(folder, screen.get_size(), fps=FPS)
+                else:
+                    recorder.close()
+                    print(f"Recorded {recorder.written} frames to {recorder.directory}, {recorder.dropped} dropped")
+                    recorder = None
+
+        steps = 0
+        while accumulator >= step_time and steps < MAX_STEPS_PER_FRAME * SPEEDS[speed]:
+            current, _ = swarm_arrays(env)
+            previous = current.copy()
+            env.update(keys)
+            accumulator -= step_time
+            steps += 1
+        # Drop time we could not simulate instead of falling further behind
+        accumulator = min(accumulator, step_time)
+
+        frame += 1
+        if frame % RENDER_EVERY[render_every]:
+            continue
+
+        screen.fill((0, 0, 0))
+        info_lines = [
+            "Simulation Mode: Manual Demo",
+            f"Boid Count: {env.num_boids}",
+            "Leader Control: Arrow Keys",
+            f"Predator: {'On' if env.with_predator else 'Off'}",
+            f"Logging: {env.log_file.split('/')[-1]}",
+            f"Speed: {SPEEDS[speed]}x (S)   Render every {RENDER_EVERY[render_every]} frames (R)",
+            f"FPS: {clock.get_fps():.0f}   Steps this frame: {steps}",
+            "Profiler: P",
+            f"Recording: {'On' if recorder is not None else 'Off'} (V)"
+        ]
+        # Per-phase timings of env.update while profiling is on
+        if env.profiler is not None:
+            info_lines += [""] + env.profiler.overlay_lines()
+        hud.draw_lines(screen, info_lines)
+
+        # Draw boids part-way between the last two steps so motion stays smooth at any step rate
+        current, _ = swarm_arrays(env)
+        renderer.draw(env, screen, interpolate(previous, current, accumulator / step_time, width, height))
+        pygame.display.flip()
+        if recorder is not None:
+            recorder.capture(screen)
+
+    if recorder is not None:
+        recorder.close()
+    env.close()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import numpy as np
+from .engine import NEIGHBOR_DISTANCE, COLLISION_DISTANCE, lengths
+
+CLUSTER_DISTANCE = 50  # boids closer than this belong to the same cluster
+
+# Metrics that can be logged, in log column order; the pair-based ones use the neighbour pairs
+METRICS = ["Avg Distance to Center", "Polarization", "Nearest Neighbor Distance", "Clusters"]
+PAIR_METRICS = {"Nearest Neighbor Distance", "Clusters"}
+DEFAULT_METRICS = ["Avg Distance to Center"]
+
+
+def avg_distance_to_center(positions):
+    # Python's sum() in boid order, like the original per-boid loop, so that the default log column keeps
+    # its exact values; NumPy's pairwise mean rounds differently in the last digits
+    count = len(positions)
+    center = np.array([sum(positions[:, 0].tolist()) / count, sum(positions[:, 1].tolist()) / count])
+    return sum(lengths(positions - center).tolist()) / count
+
+
+def polarization(velocities):
+    # Length of the mean heading: 1 when every boid flies the same way, near 0 when headings cancel out
+    speeds = lengths(velocities)
+    moving = speeds > 0
+    if not moving.any():
+        return 0.0
+    headings = velocities[moving] / speeds[moving, None]
+    return float(lengths(headings.mean(axis=0)))
+
+
+def nearest_neighbor_distance(count, pairs):
+    # Mean distance to the nearest other boid, over boids with a neighbour within NEIGHBOR_DISTANCE
+    i, _, _, distances = pairs
+    nearest = np.full(count, np.inf)
+    np.minimum.at(nearest, i, distances)
+    found = np.isfinite(nearest)
+    return float(nearest[found].mean()) if found.any() else float("nan")
+
+
+def cluster_labels(count, pairs, radius=CLUSTER_DISTANCE):
+    # Lowest boid number of the connected group each boid belongs to, boids being linked by pairs closer
+    # than radius (label propagation with pointer jumping)
+    i, j, _, distances = pairs
+    linked = distances < radius
+    i, j = i[linked], j[linked]
+    labels = np.arange(count)
+    while True:
+        merged = labels.copy()
+        np.minimum.at(merged, i, labels[j])
+        merged = merged[merged]
+        if np.array_equal(merged, labels):
+            return labels
+        labels = merged
+
+
+def cluster_count(count, pairs, radius=CLUSTER_DISTANCE):
+    return len(np.unique(cluster_labels(count, pairs, radius)))
+
+
+def collision_count(pairs, radius=COLLISION_DISTANCE):
+    i, j, _, distances = pairs
+    return int(np.count_nonzero((i < j) & (distances < radius)))
+
+
+def group_means(values, groups, count):
+    # Mean of values within each of `count` groups (NaN for an empty group)
+    sizes = np.bincount(groups, minlength=count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.bincount(groups, values, minlength=count) / sizes
+
+
+def replica_metrics(names, positions, velocities, groups, count, pairs=None):
+    # The metrics above for every replica of an ensemble at once (groups[i]: replica of boid i), as
+    # arrays of `count` values; the pair-based ones need the pairs within each replica
+    centers = np.stack([group_means(positions[:, 0], groups, count), group_means(positions[:, 1], groups, count)],
+                       axis=1)
+    values = {}
+    for name in names:
+        if name == "Avg Distance to Center":
+            values[name] = group_means(lengths(positions - centers[groups]), groups, count)
+        elif name == "Polarization":
+            speeds = lengths(velocities)
+            moving = speeds > 0
+            headings = np.divide(velocities, speeds[:, None], out=np.zeros_like(velocities), where=moving[:, None])
+            sizes = np.maximum(np.bincount(groups[moving], minlength=count), 1)
+            mean = np.stack([np.bincount(groups, headings[:, 0], count), np.bincount(groups, headings[:, 1], count)],
+                            axis=1) / sizes[:, None]
+            values[name] = lengths(mean)
+        elif name == "Nearest Neighbor Distance":
+            i, _, _, distances = pairs
+            nearest = np.full(len(positions), np.inf)
+            np.minimum.at(nearest, i, distances)
+            found = np.isfinite(nearest)
+            values[name] = group_means(nearest[found], groups[found], count)
+        elif name == "Clusters":
+            # Pairs never cross replicas, so every cluster lies within one replica
+            labels = np.unique(cluster_labels(len(positions), pairs))
+            values[name] = np.bincount(groups[labels], minlength=count)
+    return values
+
+
+def replica_collisions(pairs, groups, count, radius=COLLISION_DISTANCE):
+    i, j, _, distances = pairs
+    colliding = (i < j) & (distances < radius)
+    return np.bincount(groups[i[colliding]], minlength=count)
+
+
+class MetricsCollector:
+    # Swarm metrics for the log, computed in batch from position/velocity arrays every `every` steps
+    def __init__(self, names=None, every=1):
+        names = DEFAULT_METRICS if names is None else list(names)
+        unknown = [name for name in names if name not in METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metric(s): {', '.join(unknown)}; choose from {', '.join(METRICS)}")
+        if every < 1:
+            raise ValueError("Metrics sampling interval must be at least 1 step")
+        self.names = [name for name in METRICS if name in names]
+        self.every = every
+        self.pairs = None
+
+    def due(self, step):
+        return step % self.every == 0
+
+    def measure(self, positions, velocities, index):
+        # Values in self.names order; the neighbour pairs are kept in self.pairs for the flocking step
+        self.pairs = None
+        if any(name in PAIR_METRICS for name in self.names):
+            self.pairs = index.pairs(positions, NEIGHBOR_DISTANCE)
+        values = []
+        for name in self.names:
+            if name == "Avg Distance to Center":
+                values.append(avg_distance_to_center(positions))
+            elif name == "Polarization":
+                values.append(polarization(velocities))
+            elif name == "Nearest Neighbor Distance":
+                values.append(nearest_neighbor_distance(len(positions), self.pairs))
+            elif name == "Clusters":
+                values.append(cluster_count(len(positions), self.pairs))
+        return values
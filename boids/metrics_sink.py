@@ -0,0 +1,195 @@
+import abc
+import atexit
+import csv
+import os
+import time
+import numpy as np
+
+FLUSH_ROWS = 1000
+FLUSH_SECONDS = 5.0
+OPEN_SINKS = set()  # sinks not closed yet, flushed and closed at exit
+
+
+def close_open_sinks():
+    for sink in list(OPEN_SINKS):
+        sink.close()
+
+
+atexit.register(close_open_sinks)
+
+
+class MetricsSink(abc.ABC):
+    # Keeps the log open and buffers rows, flushing every FLUSH_ROWS rows, FLUSH_SECONDS seconds and on close
+    def __init__(self, path, headers, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.headers = list(headers)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.rows = []
+        self.last_flush = time.monotonic()
+        self.closed = False
+        OPEN_SINKS.add(self)
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.write_rows(self.rows)
+            self.rows = []
+        self.last_flush = time.monotonic()
+
+    @abc.abstractmethod
+    def write_rows(self, rows):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.finish()
+        self.closed = True
+        OPEN_SINKS.discard(self)
+
+    def finish(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(MetricsSink):
+    def __init__(self, path, headers, **options):
+        super().__init__(path, headers, **options)
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.headers)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def finish(self):
+        self.file.close()
+
+
+class NpyChunkSink(MetricsSink):
+    # A directory with one .npy file per column per flushed chunk, plus the column names
+    def __init__(self, path, headers, **options):
+        super().__init__(path, headers, **options)
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            os.remove(os.path.join(path, name))
+        with open(os.path.join(path, "columns.txt"), "w") as f:
+            f.write("\n".join(self.headers) + "\n")
+        self.chunks = 0
+
+    def write_rows(self, rows):
+        for column, values in enumerate(zip(*rows)):
+            np.save(os.path.join(self.path, f"chunk{self.chunks:05d}_col{column}.npy"), np.asarray(values))
+        self.chunks += 1
+
+
+class ParquetSink(MetricsSink):
+    # One Parquet row group per flushed chunk; needs the optional pyarrow package
+    def __init__(self, path, headers, **options):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet metrics logs need pyarrow: pip install pyarrow")
+        super().__init__(path, headers, **options)
+        self.pa = pyarrow
+        self.writer = None
+
+    def write_rows(self, rows):
+        table = self.pa.table({name: list(values) for name, values in zip(self.headers, zip(*rows))})
+        if self.writer is None:
+            self.writer = self.pa.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def finish(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+SINKS = {
+    ".csv": CsvSink,
+    ".npyd": NpyChunkSink,
+    ".parquet": ParquetSink
+}
+
+
+def log_format(path):
+    return os.path.splitext(path.rstrip("/"))[1]
+
+
+def is_log(path):
+    # Unfinished logs are named *.part.<format> until their run completes
+    return log_format(path) in SINKS and not os.path.splitext(path.rstrip("/"))[0].endswith(".part")
+
+
+def open_sink(path, headers, **options):
+    fmt = log_format(path)
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown metrics log format for {path}; use one of {', '.join(SINKS)}")
+    # Logs go to results/ in the working directory by default, which may not exist yet
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return SINKS[fmt](path, headers, **options)
+
+
+def read_log(path, columns=None):
+    # Columns missing from the log are left out rather than raising
+    import pandas as pd
+    fmt = log_format(path)
+    if fmt == ".csv":
+        return pd.read_csv(path, usecols=None if columns is None else lambda name: name in columns)
+    if fmt == ".parquet":
+        if columns is not None:
+            import pyarrow.parquet
+            names = pyarrow.parquet.ParquetFile(path).schema_arrow.names
+            columns = [name for name in columns if name in names]
+        return pd.read_parquet(path, columns=columns)
+    if fmt == ".npyd":
+        with open(os.path.join(path, "columns.txt")) as f:
+            headers = f.read().split("\n")[:-1]
+        chunks = sorted({name.split("_")[0] for name in os.listdir(path) if name.endswith(".npy")})
+        data = {}
+        for column, name in enumerate(headers):
+            if columns is not None and name not in columns:
+                continue
+            parts = [np.load(os.path.join(path, f"{chunk}_col{column}.npy"), mmap_mode="r") for chunk in chunks]
+            data[name] = np.concatenate(parts) if parts else np.array([])
+        return pd.DataFrame(data)
+    raise ValueError(f"Unknown metrics log format for {path}")
+
+
+def iter_log(path, columns=None, chunk_rows=100000):
+    # Read a log as a sequence of DataFrames of about chunk_rows rows, so long runs never sit in memory at once
+    import pandas as pd
+    fmt = log_format(path)
+    if fmt == ".csv":
+        yield from pd.read_csv(path, usecols=None if columns is None else lambda name: name in columns,
+                               chunksize=chunk_rows)
+    elif fmt == ".parquet":
+        import pyarrow.parquet
+        parquet = pyarrow.parquet.ParquetFile(path)
+        if columns is not None:
+            columns = [name for name in columns if name in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif fmt == ".npyd":
+        with open(os.path.join(path, "columns.txt")) as f:
+            headers = f.read().split("\n")[:-1]
+        chunks = sorted({name.split("_")[0] for name in os.listdir(path) if name.endswith(".npy")})
+        for chunk in chunks:
+            yield pd.DataFrame({name: np.load(os.path.join(path, f"{chunk}_col{column}.npy"))
+                                for column, name in enumerate(headers)
+                                if columns is None or name in columns})
+    else:
+        raise ValueError(f"Unknown metrics log format for {path}")
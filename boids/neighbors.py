@@ -0,0 +1,230 @@
+import math
+import numpy as np
+
+DEFAULT_CELL_SIZE = 100
+REPLICA_BLOCK = 1 << 18  # pair slots per block of replicas in ReplicaIndex.pairs
+
+
+def minimum_image(offsets, width, height):
+    # Shortest offset across the wrapped edges of the world
+    offsets[:, 0] -= width * np.round(offsets[:, 0] / width)
+    offsets[:, 1] -= height * np.round(offsets[:, 1] / height)
+    return offsets
+
+
+class BruteForceIndex:
+    def __init__(self, width, height, periodic=False):
+        self.width = width
+        self.height = height
+        self.periodic = periodic
+        self.positions = np.zeros((0, 2))
+        self.checks = 0
+
+    def build(self, positions):
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+
+    def candidates(self, point, radius):
+        # None means "every boid": callers fall back to the full list
+        self.checks += len(self.positions)
+        return None
+
+    def pairs(self, positions, radius):
+        # All ordered pairs (i, j), i != j, closer than radius; offsets are positions[i] - positions[j]
+        self.build(positions)
+        n = len(self.positions)
+        self.checks += n * n
+        offsets = self.positions[:, None, :] - self.positions[None, :, :]
+        if self.periodic:
+            offsets = minimum_image(offsets.reshape(-1, 2), self.width, self.height).reshape(n, n, 2)
+        distances = np.sqrt((offsets ** 2).sum(axis=2))
+        within = distances < radius
+        np.fill_diagonal(within, False)
+        i, j = np.nonzero(within)
+        return i, j, offsets[i, j], distances[i, j]
+
+    def query(self, points, radius):
+        # Pairs (p, j) of query points and built positions closer than radius; offsets are positions[j] - points[p]
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.checks += len(points) * len(self.positions)
+        offsets = self.positions[None, :, :] - points[:, None, :]
+        if self.periodic:
+            offsets = minimum_image(offsets.reshape(-1, 2), self.width, self.height).reshape(len(points), -1, 2)
+        distances = np.sqrt((offsets ** 2).sum(axis=2))
+        p, j = np.nonzero(distances < radius)
+        return p, j, offsets[p, j], distances[p, j]
+
+
+class GridIndex:
+    def __init__(self, width, height, cell_size=DEFAULT_CELL_SIZE, periodic=False):
+        self.width = width
+        self.height = height
+        self.periodic = periodic
+        self.cols = max(1, int(width // cell_size))
+        self.rows = max(1, int(height // cell_size))
+        self.cell_width = width / self.cols
+        self.cell_height = height / self.rows
+        self.checks = 0
+        self.build(np.zeros((0, 2)))
+
+    def cell_of(self, x, y):
+        # Boid.wrap_around can leave a boid exactly on the far edge, which belongs to the first cell
+        cx = np.floor_divide(x, self.cell_width).astype(np.int64) % self.cols
+        cy = np.floor_divide(y, self.cell_height).astype(np.int64) % self.rows
+        return cx, cy
+
+    def build(self, positions):
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.cx, self.cy = self.cell_of(self.positions[:, 0], self.positions[:, 1])
+        cells = self.cx * self.rows + self.cy
+        self.order = np.argsort(cells, kind="stable")
+        self.starts = np.zeros(self.cols * self.rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.cols * self.rows), out=self.starts[1:])
+
+    def steps(self, radius):
+        # Cell offsets to visit, wrapped so that boids teleported by wrap_around are still found
+        reach_x = math.ceil(radius / self.cell_width)
+        reach_y = math.ceil(radius / self.cell_height)
+        steps_x = sorted({d % self.cols for d in range(-reach_x, reach_x + 1)})
+        steps_y = sorted({d % self.rows for d in range(-reach_y, reach_y + 1)})
+        return [(dx, dy) for dx in steps_x for dy in steps_y]
+
+    def candidates(self, point, radius):
+        # Superset of the boids within radius of point, in index order
+        cx, cy = self.cell_of(point[0], point[1])
+        chunks = []
+        for dx, dy in self.steps(radius):
+            cell = (cx + dx) % self.cols * self.rows + (cy + dy) % self.rows
+            chunks.append(self.order[self.starts[cell]:self.starts[cell + 1]])
+        found = np.sort(np.concatenate(chunks))
+        self.checks += len(found)
+        return found
+
+    def pairs(self, positions, radius):
+        self.build(positions)
+        n = len(self.positions)
+        everyone = np.arange(n)
+        all_i, all_j = [], []
+        for dx, dy in self.steps(radius):
+            cells = (self.cx + dx) % self.cols * self.rows + (self.cy + dy) % self.rows
+            lo = self.starts[cells]
+            counts = self.starts[cells + 1] - lo
+            total = int(counts.sum())
+            # Expand every boid against every member of its neighbouring cell
+            i = np.repeat(everyone, counts)
+            within_cell = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            all_i.append(i)
+            all_j.append(self.order[np.repeat(lo, counts) + within_cell])
+        i = np.concatenate(all_i)
+        j = np.concatenate(all_j)
+        self.checks += len(i)
+
+        keep = i != j
+        i, j = i[keep], j[keep]
+        offsets = self.positions[i] - self.positions[j]
+        if self.periodic:
+            offsets = minimum_image(offsets, self.width, self.height)
+        distances = np.sqrt((offsets ** 2).sum(axis=1))
+        keep = distances < radius
+        return i[keep], j[keep], offsets[keep], distances[keep]
+
+    def query(self, points, radius):
+        # Same as BruteForceIndex.query, visiting only the cells around each point
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        px, py = self.cell_of(points[:, 0], points[:, 1])
+        everyone = np.arange(len(points))
+        all_p, all_j = [], []
+        for dx, dy in self.steps(radius):
+            cells = (px + dx) % self.cols * self.rows + (py + dy) % self.rows
+            lo = self.starts[cells]
+            counts = self.starts[cells + 1] - lo
+            within_cell = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+            all_p.append(np.repeat(everyone, counts))
+            all_j.append(self.order[np.repeat(lo, counts) + within_cell])
+        p = np.concatenate(all_p)
+        j = np.concatenate(all_j)
+        self.checks += len(p)
+        offsets = self.positions[j] - points[p]
+        if self.periodic:
+            offsets = minimum_image(offsets, self.width, self.height)
+        distances = np.sqrt((offsets ** 2).sum(axis=1))
+        keep = distances < radius
+        return p[keep], j[keep], offsets[keep], distances[keep]
+
+
+class ReplicaIndex:
+    # Brute force within each replica of an ensemble: boids are stacked replica by replica, starts[r]
+    # is where replica r begins, and only boids of the same replica are ever paired. Each boid's pairs
+    # come in the same order as from a BruteForceIndex over its replica alone
+    def __init__(self, width, height, starts):
+        self.width = width
+        self.height = height
+        self.starts = np.asarray(starts, dtype=np.int64)
+        sizes = np.diff(self.starts)
+        self.groups = np.repeat(np.arange(len(sizes)), sizes)
+        self.slots = np.arange(len(self.groups)) - self.starts[self.groups]
+        self.size = int(sizes.max()) if len(sizes) else 0
+        # Replicas of the same size go through pairs() together, in blocks of about REPLICA_BLOCK pair slots
+        self.blocks = []
+        for size in np.unique(sizes[sizes > 1]).tolist():
+            replicas = np.flatnonzero(sizes == size)
+            step = max(1, REPLICA_BLOCK // (size * size))
+            for first in range(0, len(replicas), step):
+                self.blocks.append(self.starts[replicas[first:first + step], None] + np.arange(size))
+        self.checks = 0
+        self.build(np.zeros((len(self.groups), 2)))
+
+    def build(self, positions):
+        # Replicas padded to the same size with points at infinity, which are never within any radius
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.padded = np.full((len(self.starts) - 1, self.size, 2), np.inf)
+        self.padded[self.groups, self.slots] = self.positions
+
+    def pairs(self, positions, radius):
+        self.build(positions)
+        all_i, all_j, all_offsets, all_distances = [], [], [], []
+        for members in self.blocks:
+            # members: (replicas, size) boid numbers; offsets and distances as in BruteForceIndex.pairs
+            x, y = self.positions[members, 0], self.positions[members, 1]
+            dx = x[:, :, None] - x[:, None, :]
+            dy = y[:, :, None] - y[:, None, :]
+            distances = np.sqrt(dx * dx + dy * dy)
+            size = members.shape[1]
+            within = distances < radius
+            within[:, np.arange(size), np.arange(size)] = False
+            # Flat positions in the (replicas, size, size) block: replica r, boid a, other boid b
+            found = np.flatnonzero(within)
+            ra, b = np.divmod(found, size)
+            members = members.ravel()
+            all_i.append(members[ra])
+            all_j.append(members[ra - ra % size + b])
+            all_offsets.append(np.stack([dx.ravel()[found], dy.ravel()[found]], axis=1))
+            all_distances.append(distances.ravel()[found])
+            self.checks += members.size * size
+        if not all_i:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 2)), np.zeros(0)
+        return (np.concatenate(all_i), np.concatenate(all_j), np.concatenate(all_offsets),
+                np.concatenate(all_distances))
+
+    def query(self, points, radius, groups):
+        # Like BruteForceIndex.query, with groups[p] the replica of point p: it only meets that replica's boids
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        groups = np.asarray(groups, dtype=np.int64)
+        self.checks += int(np.diff(self.starts)[groups].sum())
+        offsets = self.padded[groups] - points[:, None, :]
+        distances = np.sqrt((offsets ** 2).sum(axis=2))
+        p, b = np.nonzero(distances < radius)
+        return p, self.starts[groups[p]] + b, offsets[p, b], distances[p, b]
+
+
+INDEXES = {
+    "brute": BruteForceIndex,
+    "grid": GridIndex
+}
+
+
+def make_index(kind, width, height, **options):
+    if not isinstance(kind, str):
+        return kind
+    if kind not in INDEXES:
+        raise ValueError(f"Unknown neighbor index: {kind}")
+    return INDEXES[kind](width, height, **options)
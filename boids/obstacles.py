@@ -0,0 +1,257 @@
+import argparse
+import csv
+import json
+import math
+import os
+import numpy as np
+from .engine import OBSTACLE_MARGIN, OBSTACLE_STRENGTH, lengths
+
+SHAPES = ["circle", "square", "triangle"]
+# "center" pushes boids away from the obstacle centre within size + OBSTACLE_MARGIN (the original rule),
+# "sdf" pushes them along the outward normal of the shape's outline within OBSTACLE_MARGIN of it
+AVOIDANCE_MODES = ["center", "sdf"]
+# Distance from the centre to the farthest point of each shape, per unit of size
+SHAPE_REACH = {"circle": 1.0, "square": math.sqrt(2) / 2, "triangle": math.sqrt(2)}
+
+
+class Point:
+    # An obstacle's centre; only x and y are ever read, so building a map needs no pygame Vector2
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = float(x)
+        self.y = float(y)
+
+
+class Obstacle:
+    def __init__(self, x, y, size, shape="circle"):
+        if shape not in SHAPES:
+            raise ValueError(f"Unknown obstacle shape: {shape}")
+        self.position = Point(x, y)
+        self.size = size
+        self.shape = shape
+
+    def draw(self, screen):
+        import pygame
+        if self.shape == "circle":
+            pygame.draw.circle(screen, (255, 0, 0), (int(self.position.x), int(self.position.y)), self.size, width=2)
+        elif self.shape == "square":
+            rect = pygame.Rect(self.position.x - self.size/2, self.position.y - self.size/2, self.size, self.size)
+            pygame.draw.rect(screen, (255, 165, 0), rect, width=2)
+        elif self.shape == "triangle":
+            points = [
+                (self.position.x, self.position.y - self.size),
+                (self.position.x - self.size, self.position.y + self.size),
+                (self.position.x + self.size, self.position.y + self.size)
+            ]
+            pygame.draw.polygon(screen, (255, 255, 0), points, width=2)
+
+
+def load_obstacle_map(path):
+    # Obstacles from a .csv (columns shape, x, y, size) or a .json list of {"shape", "x", "y", "size"}
+    if path.endswith(".json"):
+        with open(path) as f:
+            rows = json.load(f)
+    else:
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+    return [Obstacle(float(row["x"]), float(row["y"]), float(row["size"]), row.get("shape") or "circle")
+            for row in rows]
+
+
+def save_obstacle_map(obstacles, path):
+    rows = [{"shape": o.shape, "x": o.position.x, "y": o.position.y, "size": o.size} for o in obstacles]
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(rows, f)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["shape", "x", "y", "size"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def random_obstacle_map(count, width, height, min_size=5, max_size=20, seed=0):
+    rng = np.random.default_rng(seed)
+    shapes = rng.choice(SHAPES, count)
+    xs, ys = rng.uniform(0, width, count), rng.uniform(0, height, count)
+    sizes = rng.uniform(min_size, max_size, count)
+    return [Obstacle(x, y, size, shape) for shape, x, y, size in zip(shapes.tolist(), xs.tolist(), ys.tolist(),
+                                                                       sizes.tolist())]
+
+
+def circle_distance(offsets, sizes):
+    distances = lengths(offsets)
+    normals = np.divide(offsets, distances[:, None], out=np.zeros_like(offsets), where=distances[:, None] > 0)
+    return distances - sizes, normals
+
+
+def square_distance(offsets, sizes):
+    # Axis-aligned square of side `size` centred on the obstacle
+    q = np.abs(offsets) - (sizes / 2)[:, None]
+    outside = np.maximum(q, 0)
+    outside_distances = lengths(outside)
+    normals = np.sign(offsets) * np.divide(outside, outside_distances[:, None], out=np.zeros_like(outside),
+                                           where=outside_distances[:, None] > 0)
+    # Inside, the nearest side is the one along the axis with the larger q
+    inside = outside_distances == 0
+    along_x = q[:, 0] > q[:, 1]
+    normals[inside & along_x, 0] = np.sign(offsets[inside & along_x, 0])
+    normals[inside & ~along_x, 1] = np.sign(offsets[inside & ~along_x, 1])
+    return outside_distances + np.minimum(q.max(axis=1), 0), normals
+
+
+def triangle_distance(offsets, sizes):
+    # Triangle with corners (0, -size), (-size, size), (size, size) around the obstacle centre
+    s = sizes[:, None]
+    corners = [np.hstack([0 * s, -s]), np.hstack([-s, s]), np.hstack([s, s])]
+    nearest = None
+    sides = []
+    for start, end in zip(corners, corners[1:] + corners[:1]):
+        edge = end - start
+        to_point = offsets - start
+        t = np.clip((to_point * edge).sum(axis=1) / (edge * edge).sum(axis=1), 0, 1)
+        away = to_point - edge * t[:, None]
+        if nearest is None:
+            nearest = away
+        else:
+            closer = lengths(away) < lengths(nearest)
+            nearest[closer] = away[closer]
+        sides.append(edge[:, 0] * to_point[:, 1] - edge[:, 1] * to_point[:, 0])
+    sides = np.array(sides)
+    inside = (sides >= 0).all(axis=0) | (sides <= 0).all(axis=0)
+    distances = lengths(nearest)
+    normals = np.divide(nearest, distances[:, None], out=np.zeros_like(nearest), where=distances[:, None] > 0)
+    normals[inside] *= -1
+    return np.where(inside, -distances, distances), normals
+
+
+DISTANCES = {"circle": circle_distance, "square": square_distance, "triangle": triangle_distance}
+
+
+class ObstacleField:
+    # Static obstacles in a uniform grid: every cell lists, in obstacle order, the obstacles whose
+    # area of influence overlaps it, so a boid only looks at the obstacles listed in its own cell.
+    # Built once; rebuild it after changing the obstacles
+    def __init__(self, obstacles, avoidance="center", cell_size=None):
+        if avoidance not in AVOIDANCE_MODES:
+            raise ValueError(f"Unknown obstacle avoidance: {avoidance}")
+        self.avoidance = avoidance
+        self.shapes = [o.shape for o in obstacles]
+        self.centers = np.array([(o.position.x, o.position.y) for o in obstacles], dtype=np.float64).reshape(-1, 2)
+        self.sizes = np.array([o.size for o in obstacles], dtype=np.float64)
+        self.kinds = np.array([SHAPES.index(shape) for shape in self.shapes], dtype=np.int64)
+        if avoidance == "center":
+            self.reach = self.sizes + OBSTACLE_MARGIN
+        else:
+            self.reach = self.sizes * np.array([SHAPE_REACH[shape] for shape in SHAPES])[self.kinds] + OBSTACLE_MARGIN
+        self.build(cell_size)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def build(self, cell_size=None):
+        if not len(self):
+            self.origin, self.cell_size, self.cols, self.rows = np.zeros(2), 1.0, 0, 0
+            self.entries = np.zeros(0, dtype=np.int64)
+            self.starts = np.zeros(1, dtype=np.int64)
+            return
+        # Cells about half as wide as a typical area of influence keep every list short
+        self.cell_size = float(cell_size or np.median(self.reach))
+        low = self.centers - self.reach[:, None]
+        high = self.centers + self.reach[:, None]
+        self.origin = low.min(axis=0)
+        self.cols, self.rows = (np.floor((high.max(axis=0) - self.origin) / self.cell_size).astype(np.int64) + 1)
+        first = np.floor((low - self.origin) / self.cell_size).astype(np.int64)
+        last = np.floor((high - self.origin) / self.cell_size).astype(np.int64)
+        spans = last - first + 1
+        counts = spans[:, 0] * spans[:, 1]
+        owners = np.repeat(np.arange(len(self)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = first[owners, 0] + k // spans[owners, 1]
+        cy = first[owners, 1] + k % spans[owners, 1]
+        cells = cx * self.rows + cy
+        # A stable sort keeps each cell's obstacles in obstacle order
+        order = np.argsort(cells, kind="stable")
+        self.entries = owners[order]
+        self.starts = np.searchsorted(cells[order], np.arange(self.cols * self.rows + 1))
+
+    def cells_of(self, positions):
+        # Cell number of each position, -1 outside the grid
+        cx = np.floor((positions[:, 0] - self.origin[0]) / self.cell_size)
+        cy = np.floor((positions[:, 1] - self.origin[1]) / self.cell_size)
+        inside = (cx >= 0) & (cx < self.cols) & (cy >= 0) & (cy < self.rows)
+        return np.where(inside, cx * self.rows + cy, -1).astype(np.int64)
+
+    def candidates(self, x, y):
+        # Obstacles whose area of influence may contain (x, y), in obstacle order
+        cell = self.cells_of(np.array([[x, y]], dtype=np.float64))[0]
+        if cell < 0:
+            return []
+        return self.entries[self.starts[cell]:self.starts[cell + 1]].tolist()
+
+    def pairs(self, positions):
+        # (boid, obstacle) candidate pairs, grouped by boid and in obstacle order within a boid
+        cells = self.cells_of(positions)
+        boids = np.flatnonzero(cells >= 0)
+        cells = cells[boids]
+        counts = self.starts[cells + 1] - self.starts[cells]
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(boids, counts), self.entries[np.repeat(self.starts[cells], counts) + k]
+
+    def signed_distances(self, points, ids):
+        # Distance from each point to the outline of its obstacle (negative inside) and the outward normal
+        distances = np.empty(len(ids))
+        normals = np.empty((len(ids), 2))
+        kinds = self.kinds[ids]
+        for kind, shape in enumerate(SHAPES):
+            mask = kinds == kind
+            if mask.any():
+                distances[mask], normals[mask] = DISTANCES[shape](points[mask] - self.centers[ids[mask]],
+                                                                  self.sizes[ids[mask]])
+        return distances, normals
+
+    def forces(self, positions):
+        # Avoidance acceleration of every boid, summed over the obstacles in obstacle order
+        force = np.zeros_like(positions)
+        boids, ids = self.pairs(positions)
+        if not len(ids):
+            return force
+        if self.avoidance == "center":
+            # FlockEngine.avoid on the candidate pairs only
+            away = positions[boids] - self.centers[ids]
+            distances = lengths(away)
+            safe_distance = self.reach[ids]
+            active = (distances > 0) & (distances < safe_distance)
+            strength = np.divide(safe_distance - distances, safe_distance * distances,
+                                 out=np.zeros_like(distances), where=active)
+            push = away * (strength * OBSTACLE_STRENGTH)[:, None]
+        else:
+            # Grows linearly from the edge of the margin and keeps growing inside the shape
+            distances, normals = self.signed_distances(positions[boids], ids)
+            strength = np.maximum(OBSTACLE_MARGIN - distances, 0) / OBSTACLE_MARGIN
+            push = normals * (strength * OBSTACLE_STRENGTH)[:, None]
+        force[:, 0] = np.bincount(boids, push[:, 0], minlength=len(positions))
+        force[:, 1] = np.bincount(boids, push[:, 1], minlength=len(positions))
+        return force
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write a random obstacle map for Environment(obstacle_map=...).")
+    parser.add_argument("output", help="map file to write (.csv or .json)")
+    parser.add_argument("--count", type=int, default=1000, help="number of obstacles")
+    parser.add_argument("--width", type=float, default=800)
+    parser.add_argument("--height", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    save_obstacle_map(random_obstacle_map(args.count, args.width, args.height, seed=args.seed), args.output)
+    print(f"Wrote {args.count} obstacles to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from .engine import FlockEngine, NEIGHBOR_DISTANCE, COLLISION_DISTANCE
+from .obstacles import ObstacleField
+
+# Halo width around each tile: every boid that can be a neighbour of a boid in the tile
+HALO = NEIGHBOR_DISTANCE
+STEP_TIMEOUT = 600  # seconds before a stuck worker breaks the barrier
+
+
+def tile_grid(workers, width, height):
+    # tiles_x * tiles_y == workers, with tiles as close to square as the factors allow
+    best = (workers, 1)
+    for tiles_x in range(1, workers + 1):
+        if workers % tiles_x:
+            continue
+        tiles_y = workers // tiles_x
+        if abs(math.log(width / tiles_x / (height / tiles_y))) < abs(math.log(width / best[0] / (height / best[1]))):
+            best = (tiles_x, tiles_y)
+    return best
+
+
+def tile_members(positions, tile, tiles, width, height, halo=HALO, periodic=False):
+    # Boids owned by the tile and boids within halo of it (owned ones included), as boolean masks
+    tx, ty = tile
+    tiles_x, tiles_y = tiles
+    tile_width, tile_height = width / tiles_x, height / tiles_y
+    x, y = positions[:, 0], positions[:, 1]
+    # Boid.wrap_around can leave a boid exactly on the far edge; it stays with the last tile, next to its neighbours
+    owned = ((np.clip(np.floor_divide(x, tile_width), 0, tiles_x - 1) == tx)
+             & (np.clip(np.floor_divide(y, tile_height), 0, tiles_y - 1) == ty))
+    dx = x - (tx + 0.5) * tile_width
+    dy = y - (ty + 0.5) * tile_height
+    if periodic:
+        dx -= width * np.round(dx / width)
+        dy -= height * np.round(dy / height)
+    near = (np.abs(dx) <= tile_width / 2 + halo) & (np.abs(dy) <= tile_height / 2 + halo)
+    return owned, near | owned
+
+
+def attach(name):
+    # Workers only map the memory; the engine that created it also unlinks it. Before Python 3.13
+    # attaching registers the block again with the resource tracker the workers share with the engine,
+    # which is harmless because the engine's unlink unregisters it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def tile_worker(worker, tile, tiles, names, width, height, index, params, barrier):
+    # Runs in its own process: waits for the step parameters, steps the boids owned by its tile
+    # from the shared state, writes them to the shared output arrays, then meets the others at the barrier
+    blocks = [attach(name) for name, _, _ in names]
+    try:
+        positions, velocities, new_positions, new_velocities, results = (
+            np.ndarray(shape, dtype=dtype, buffer=block.buf) for block, (_, shape, dtype) in zip(blocks, names))
+        periodic = getattr(index, "periodic", False)
+        field = None
+        while True:
+            step = params.recv()
+            if step is None:
+                break
+            # The obstacle field is only sent when it changes
+            if isinstance(step, ObstacleField):
+                field = step
+                continue
+            (sep_weight, ali_weight, coh_weight, predator_position, obstacle_positions, obstacle_sizes, leader,
+             use_field) = step
+
+            owned, local = tile_members(positions, tile, tiles, width, height, periodic=periodic)
+            if leader is not None:
+                local[leader] = True
+            members = np.flatnonzero(local)
+            owned_local = owned[members]
+            if not owned_local.any():
+                results[worker] = 0, 0
+                barrier.wait()
+                continue
+
+            # The same phases as FlockEngine.step, on the tile plus its halo; local order follows
+            # the global order, so the sums come out exactly as in a single process
+            engine = FlockEngine(positions[members], velocities[members], width, height, index)
+            acceleration = engine.flocking(sep_weight, ali_weight, coh_weight)
+            if predator_position is not None and len(predator_position):
+                acceleration += engine.flee(predator_position)
+            i, j, _, distances = engine.neighbors
+            collisions = np.count_nonzero((i < j) & (distances < COLLISION_DISTANCE) & owned_local[i])
+            if use_field:
+                acceleration += field.forces(engine.positions)
+            elif obstacle_positions is not None and len(obstacle_positions):
+                acceleration += engine.avoid(obstacle_positions, obstacle_sizes)
+            if leader is not None:
+                acceleration += engine.follow(int(np.searchsorted(members, leader)))
+            engine.integrate(acceleration)
+
+            mine = members[owned_local]
+            new_positions[mine] = engine.positions[owned_local]
+            new_velocities[mine] = engine.velocities[owned_local]
+            results[worker] = collisions, index.checks
+            index.checks = 0
+            barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    except BaseException:
+        barrier.abort()
+        raise
+
+
+class ParallelEngine(FlockEngine):
+    # FlockEngine whose step is split over worker processes, one per tile of the world. Boid state
+    # lives in shared memory; a barrier ends every step once all tiles have been written
+    def __init__(self, positions, velocities, width, height, index=None, workers=None):
+        super().__init__(positions, velocities, width, height, index)
+        self.workers = workers or os.cpu_count() or 1
+        self.tiles = tile_grid(self.workers, width, height)
+        self.blocks = []
+        self.processes = []
+        self.pipes = []
+        self.barrier = None
+        self.sent_field = None
+        self.start()
+        atexit.register(self.close)
+
+    def start(self):
+        count = len(self.positions)
+        layout = [("positions", (count, 2), np.float64),
+                  ("velocities", (count, 2), np.float64),
+                  ("new_positions", (count, 2), np.float64),
+                  ("new_velocities", (count, 2), np.float64),
+                  ("results", (self.workers, 2), np.int64)]
+        arrays = {}
+        names = []
+        for key, shape, dtype in layout:
+            block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            self.blocks.append(block)
+            arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            names.append((block.name, shape, dtype))
+        arrays["positions"][:] = self.positions
+        arrays["velocities"][:] = self.velocities
+        self.positions, self.velocities = arrays["positions"], arrays["velocities"]
+        self.new_positions, self.new_velocities = arrays["new_positions"], arrays["new_velocities"]
+        self.results = arrays["results"]
+
+        self.barrier = multiprocessing.Barrier(self.workers + 1, timeout=STEP_TIMEOUT)
+        tiles_x, tiles_y = self.tiles
+        for worker in range(self.workers):
+            receive, send = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=tile_worker, daemon=True,
+                args=(worker, (worker % tiles_x, worker // tiles_x), self.tiles, names,
+                      self.width, self.height, self.index, receive, self.barrier))
+            process.start()
+            self.processes.append(process)
+            self.pipes.append(send)
+
+    def close(self):
+        for pipe in self.pipes:
+            try:
+                pipe.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        # Keep plain copies of the state so the engine stays readable after the memory is released
+        if self.blocks:
+            self.positions = np.array(self.positions)
+            self.velocities = np.array(self.velocities)
+            self.new_positions = self.new_velocities = self.results = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks, self.processes, self.pipes = [], [], []
+        self.sent_field = None
+
+    def resize(self, count):
+        # The shared arrays have a fixed size: restart the workers for the new swarm
+        self.close()
+        super().resize(count)
+        self.start()
+
+    def step(self, sep_weight=1.0, ali_weight=1.0, coh_weight=1.0,
+             predator_position=None, obstacle_positions=None, obstacle_sizes=None, leader_index=None,
+             obstacle_field=None):
+        if not len(self):
+            return 0
+        if not self.processes:
+            raise RuntimeError("ParallelEngine is closed")
+        profiler = self.profiler
+        if profiler: lap = profiler.clock()
+        step = (sep_weight, ali_weight, coh_weight,
+                None if predator_position is None else np.asarray(predator_position, dtype=np.float64).reshape(-1, 2),
+                None if obstacle_positions is None else [tuple(p) for p in obstacle_positions],
+                None if obstacle_sizes is None else list(obstacle_sizes),
+                leader_index, obstacle_field is not None)
+        try:
+            for pipe in self.pipes:
+                if obstacle_field is not None and obstacle_field is not self.sent_field:
+                    pipe.send(obstacle_field)
+                pipe.send(step)
+            if obstacle_field is not None:
+                self.sent_field = obstacle_field
+            self.barrier.wait()
+        except (threading.BrokenBarrierError, BrokenPipeError):
+            raise RuntimeError("A ParallelEngine worker failed; see its traceback above")
+        if profiler: lap = profiler.lap("parallel", lap)
+        self.positions[:] = self.new_positions
+        self.velocities[:] = self.new_velocities
+        self.neighbors = None
+        self.index.checks += int(self.results[:, 1].sum())
+        if profiler: profiler.lap("integration", lap)
+        return int(self.results[:, 0].sum())
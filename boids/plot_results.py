@@ -1,11 +1,14 @@
 
-import pandas as pd
+import argparse
 import os
-import plotly.graph_objs as go
-import plotly.offline as pyo
+from .metrics_sink import read_log
+from .catalog import connect, find_runs, import_existing
 
 def plot_log(file_path, title_suffix=""):
-    df = pd.read_csv(file_path)
+    # plotly is only needed once a run has been picked
+    import plotly.graph_objs as go
+    import plotly.offline as pyo
+    df = read_log(file_path)
     if df.empty or df.shape[0] == 0:
         print(f"\n[ERROR] The selected file '{file_path}' is empty. No data to plot.")
         return
@@ -30,9 +33,29 @@ def plot_log(file_path, title_suffix=""):
 
     pyo.plot(fig)
 
-if __name__ == "__main__":
-    results_dir = os.path.join(os.path.dirname(__file__), "results")
-    files = [f for f in os.listdir(results_dir) if f.startswith("simulation_log_") and f.endswith(".csv")]
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plot the metrics of one simulation run.")
+    parser.add_argument("--boids", type=int, help="only list runs with this many boids")
+    parser.add_argument("--predator", choices=["on", "off"], help="only list runs with or without the predator")
+    parser.add_argument("--results-dir", default="results",
+                        help="results directory with the logs and the catalog (default: ./results)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results_dir = args.results_dir
+    filters = {}
+    if args.boids is not None:
+        filters["num_boids"] = args.boids
+    if args.predator is not None:
+        filters["with_predator"] = args.predator == "on"
+
+    # Runs come from the catalog; it is only filled from the directory when it is still empty
+    db = connect(results_dir)
+    if not find_runs(db):
+        import_existing(db, results_dir)
+    files = [run["path"] for run in find_runs(db, **filters)]
+    db.close()
 
     print("Available result files:")
     for idx, file in enumerate(files):
@@ -42,3 +65,6 @@ if __name__ == "__main__":
     selected_file = os.path.join(results_dir, files[choice])
 
     plot_log(selected_file, title_suffix=f"({files[choice]})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import math
+import numpy as np
+from .engine import set_length, limit
+
+PREDATOR_BEHAVIORS = ["bounce", "chase"]
+PREDATOR_SPEED = 2.5  # speed of the predators added after the first one, and top speed of chasers
+CHASE_RANGE = 200  # a chasing predator targets the nearest boid within this distance
+CHASE_FORCE = 0.1
+
+
+class PredatorSwarm:
+    # Every predator as rows of (P, 2) position and velocity arrays. "bounce" predators fly straight
+    # and bounce off the screen edges like the original single predator; "chase" predators steer
+    # towards the nearest boid within CHASE_RANGE, found through the neighbour index, and wrap around
+    def __init__(self, positions, velocities, width, height, behavior="bounce"):
+        if behavior not in PREDATOR_BEHAVIORS:
+            raise ValueError(f"Unknown predator behavior: {behavior}")
+        self.positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+        self.velocities = np.array(velocities, dtype=np.float64).reshape(-1, 2)
+        self.width = width
+        self.height = height
+        self.behavior = behavior
+        self.targets = np.full(len(self.positions), -1)
+        # Replica of each predator when the swarm belongs to an ensemble (see ensemble.py)
+        self.groups = None
+
+    @classmethod
+    def spawn(cls, count, width, height, rng, behavior="bounce"):
+        # The first predator starts where the original one did. It used to be a Boid, which takes
+        # four draws from rng, so those are still made to keep seeded runs on the same random stream
+        positions, velocities = [], []
+        if count > 0:
+            for _ in range(4):
+                rng.random()
+            positions.append((0, height // 2))
+            velocities.append((2, 1.5))
+        for _ in range(count - 1):
+            positions.append((rng.uniform(0, width), rng.uniform(0, height)))
+            angle = rng.uniform(0, 2 * math.pi)
+            velocities.append((PREDATOR_SPEED * math.cos(angle), PREDATOR_SPEED * math.sin(angle)))
+        return cls(positions, velocities, width, height, behavior)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def nearest(self, boid_positions, index, radius=CHASE_RANGE):
+        # Nearest boid to every predator (-1 when none is within radius) and the offset to it
+        if index.positions is not boid_positions:
+            index.build(boid_positions)
+        targets = np.full(len(self), -1)
+        offsets = np.zeros_like(self.positions)
+        if self.groups is None:
+            p, j, towards, distances = index.query(self.positions, radius)
+        else:
+            p, j, towards, distances = index.query(self.positions, radius, self.groups)
+        order = np.lexsort((distances, p))
+        p, first = np.unique(p[order], return_index=True)
+        targets[p] = j[order][first]
+        offsets[p] = towards[order][first]
+        return targets, offsets
+
+    def move(self, boid_positions=None, index=None):
+        if self.behavior == "chase" and boid_positions is not None and len(boid_positions):
+            self.chase(boid_positions, index)
+            return
+        # The original predator's bounce, for every predator at once
+        self.positions += self.velocities
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        self.velocities[(x <= 0) | (x >= self.width), 0] *= -1
+        self.velocities[(y <= 0) | (y >= self.height), 1] *= -1
+        x[x > self.width] = 0
+
+    def chase(self, boid_positions, index):
+        self.targets, towards = self.nearest(boid_positions, index)
+        hunting = self.targets >= 0
+        steering = limit(set_length(towards, PREDATOR_SPEED) - self.velocities, CHASE_FORCE)
+        self.velocities += np.where(hunting[:, None], steering, 0.0)
+        self.velocities = limit(self.velocities, PREDATOR_SPEED)
+        self.positions += self.velocities
+        # Boid.wrap_around
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        x[x > self.width] = 0
+        x[x < 0] = self.width
+        y[y > self.height] = 0
+        y[y < 0] = self.height
@@ -0,0 +1,98 @@
+import os
+import time
+from .metrics_sink import open_sink
+
+# Phases of Environment.update, in the order they run
+PHASES = [
+    "leader_control",
+    "metrics",
+    "logging",
+    "predator_move",
+    "neighbors",
+    "flocking",
+    "predator_flee",
+    "collisions",
+    "obstacles",
+    "leader",
+    "integration",
+    "fused",  # the jit backend runs flocking to integration as one kernel
+    "parallel"  # the parallel backend waiting for its tile workers
+]
+COUNTERS = ["neighbor_checks", "boids"]
+SMOOTHING = 0.05  # weight of the newest step in the on-screen averages
+
+
+def profile_path(log_file):
+    # Profile logs sit next to the simulation log they belong to
+    folder, name = os.path.split(log_file)
+    return os.path.join(folder, f"profile_{name}")
+
+
+class Profiler:
+    # Per-phase wall time and counters for each Environment.update, opt-in via Environment.enable_profiling
+    def __init__(self):
+        self.sink = None
+        self.phases = {}
+        self.counters = {}
+        self.totals = {}
+        self.smoothed = {}
+        self.steps = 0
+        self.started = 0.0
+
+    def open(self, path):
+        self.sink = open_sink(path, ["Step"] + [f"{phase} ms" for phase in PHASES + ["total"]] + COUNTERS)
+
+    def clock(self):
+        return time.perf_counter()
+
+    def lap(self, phase, start):
+        # Charge the time since start to phase and return the current time for the next lap
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - start
+        return now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def begin_step(self):
+        self.phases = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def end_step(self, step):
+        self.phases["total"] = time.perf_counter() - self.started
+        for phase in PHASES + ["total"]:
+            seconds = self.phases.get(phase, 0.0)
+            self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+            previous = self.smoothed.get(phase, seconds)
+            self.smoothed[phase] = previous + SMOOTHING * (seconds - previous)
+        for name, value in self.counters.items():
+            self.totals[name] = self.totals.get(name, 0) + value
+        self.steps += 1
+        if self.sink is not None:
+            self.sink.write([step] + [self.phases.get(phase, 0.0) * 1000 for phase in PHASES + ["total"]]
+                            + [self.counters.get(name, 0) for name in COUNTERS])
+
+    def report(self):
+        # Totals per phase, with the mean per step and the share of the whole update
+        total = self.totals.get("total", 0.0) or 1.0
+        steps = self.steps or 1
+        rows = [{"phase": phase,
+                 "total_s": self.totals.get(phase, 0.0),
+                 "mean_ms": self.totals.get(phase, 0.0) / steps * 1000,
+                 "share": self.totals.get(phase, 0.0) / total}
+                for phase in PHASES + ["total"]]
+        counters = {name: self.totals.get(name, 0) / steps for name in COUNTERS}
+        return rows, counters
+
+    def overlay_lines(self):
+        total = self.smoothed.get("total", 0.0) or 1.0
+        lines = [f"{phase}: {self.smoothed.get(phase, 0.0) * 1000:.2f} ms "
+                 f"({self.smoothed.get(phase, 0.0) / total:.0%})" for phase in PHASES]
+        lines.append(f"update: {self.smoothed.get('total', 0.0) * 1000:.2f} ms")
+        lines += [f"{name}: {self.counters.get(name, 0)}" for name in COUNTERS]
+        return lines
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
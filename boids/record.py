@@ -0,0 +1,79 @@
+import argparse
+import os
+import time
+import pygame
+from .environment import Environment
+from .predators import PREDATOR_BEHAVIORS
+from .recorder import FrameRecorder, QUEUE_SIZE, IMAGE_FORMATS
+from .renderer import SpriteRenderer
+
+WIDTH, HEIGHT = 800, 600
+SIM_RATE = 60  # simulation steps per second of video
+STEPS = 600
+
+
+def record(env, recorder, steps=STEPS, every=1, renderer=None, lossless=False):
+    # Steps the simulation as fast as it goes and renders every `every`th step into the recorder's
+    # surfaces; the recorder writes them out in the background and drops frames it cannot keep up with,
+    # unless lossless, where the simulation waits for the encoder instead
+    renderer = renderer or SpriteRenderer()
+    for step in range(steps):
+        env.update()
+        if step % every:
+            continue
+        surface = recorder.acquire(wait=lossless)
+        if surface is None:
+            continue
+        surface.fill((0, 0, 0))
+        renderer.draw(env, surface, ticks=step * 1000 / SIM_RATE)
+        recorder.submit(surface, step // every)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record a simulation offscreen to an image sequence or video.")
+    parser.add_argument("output", help="directory for an image sequence, or a video file (.mp4, .mkv, .webm, "
+                                       ".avi; needs ffmpeg)")
+    parser.add_argument("--steps", type=int, default=STEPS, help=f"simulation steps (default {STEPS})")
+    parser.add_argument("--every", type=int, default=1,
+                        help=f"record every Nth step; the video plays at {SIM_RATE} / N frames per second")
+    parser.add_argument("--boids", type=int, default=30)
+    parser.add_argument("--size", type=int, nargs=2, default=(WIDTH, HEIGHT), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--predator", action="store_true")
+    parser.add_argument("--predators", type=int, default=1, help="number of predators with --predator")
+    parser.add_argument("--predator-behavior", choices=PREDATOR_BEHAVIORS, default="bounce")
+    parser.add_argument("--backend", choices=["python", "numpy", "jit", "parallel"], default="python")
+    parser.add_argument("--neighbor-index", choices=["brute", "grid"], default="brute")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--queue", type=int, default=QUEUE_SIZE,
+                        help=f"frames that may wait for the encoder before new ones are dropped (default {QUEUE_SIZE})")
+    parser.add_argument("--lossless", action="store_true",
+                        help="slow the simulation down to the encoder's pace instead of dropping frames")
+    parser.add_argument("--image-format", choices=IMAGE_FORMATS, default=".png")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Offscreen: no window is opened, so recording works without a display. Set here rather than on
+    # import, so that importing this module leaves the video driver of the importing program alone
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    width, height = args.size
+    env = Environment(width, height, args.boids, with_predator=args.predator,
+                      num_predators=args.predators, predator_behavior=args.predator_behavior, backend=args.backend,
+                      neighbor_index=args.neighbor_index, seed=args.seed,
+                      log_file=os.path.splitext(args.output.rstrip("/"))[0] + "_log.csv")
+    recorder = FrameRecorder(args.output, (width, height), fps=SIM_RATE / args.every, queue_size=args.queue,
+                             image_format=args.image_format)
+    start = time.time()
+    try:
+        record(env, recorder, args.steps, args.every, lossless=args.lossless)
+    finally:
+        env.close()
+        recorder.close()
+    print(f"{recorder.written} frames written to {recorder.directory or args.output}, {recorder.dropped} dropped "
+          f"({time.time() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import zlib
+import numpy as np
+import pygame
+from multiprocessing import shared_memory
+from .parallel import attach
+
+QUEUE_SIZE = 8  # frames that may wait for the encoder; when all are taken, new frames are dropped
+PNG_LEVEL = 3  # zlib compression level of recorded PNG frames
+ENCODER_NICENESS = 10  # the encoder yields the CPU to the simulation; frames are dropped instead
+IMAGE_FORMATS = [".png", ".jpg", ".bmp", ".tga"]
+VIDEO_FORMATS = [".mp4", ".mkv", ".webm", ".avi"]
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(path, pixels, level=PNG_LEVEL):
+    # pixels: (height, width, 3 or 4) uint8 array; a fourth channel is left out
+    height, width = pixels.shape[:2]
+    rows = np.zeros((height, 1 + 3 * width), dtype=np.uint8)  # filter byte 0 (none) before each row
+    rows[:, 1:] = pixels[:, :, :3].reshape(height, 3 * width)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8-bit RGB
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", header)
+                + png_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)) + png_chunk(b"IEND", b""))
+
+
+def encode_frames(names, size, directory, image_format, video, fps, frames, free, results):
+    # Runs in its own process: writes each frame named on the `frames` queue, then gives its buffer back
+    if hasattr(os, "nice"):
+        os.nice(ENCODER_NICENESS)
+    width, height = size
+    blocks = [attach(name) for name in names]
+    pixels = [np.ndarray((height, width, 4), dtype=np.uint8, buffer=block.buf) for block in blocks]
+    encoder = None
+    written = 0
+    error = None
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        number, buffer = item
+        try:
+            if error is not None:
+                continue
+            if directory is not None:
+                path = os.path.join(directory, f"frame_{number:06d}{image_format}")
+                if image_format == ".png":
+                    write_png(path, pixels[buffer])
+                else:
+                    pygame.image.save(pygame.image.frombuffer(blocks[buffer].buf, size, "RGBX"), path)
+            else:
+                if encoder is None:
+                    command = ["ffmpeg", "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb0",
+                               "-s", f"{width}x{height}", "-r", str(fps), "-i", "-", "-pix_fmt", "yuv420p", video]
+                    encoder = subprocess.Popen(command, stdin=subprocess.PIPE)
+                encoder.stdin.write(blocks[buffer].buf)
+            written += 1
+        except Exception as exc:
+            # Keep draining the queue so the simulation is not left without buffers; close() reports it
+            error = f"{type(exc).__name__}: {exc}"
+        finally:
+            free.put(buffer)
+    if encoder is not None:
+        encoder.stdin.close()
+        encoder.wait()
+    pixels.clear()
+    for block in blocks:
+        block.close()
+    results.put((written, error))
+
+
+class FrameRecorder:
+    # Frames are drawn straight into a fixed pool of surfaces backed by shared memory; an encoder
+    # process writes them out and hands each buffer back. Nothing is copied, and the simulation never
+    # waits for the encoder or the disk: when every buffer is still queued, acquire() returns None and
+    # the frame is dropped. output is a directory for an image sequence or a video file (needs ffmpeg)
+    def __init__(self, output, size, fps=60, queue_size=QUEUE_SIZE, image_format=".png"):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+        self.output = output
+        self.size = size
+        directory, video = output, None
+        if os.path.splitext(output)[1] in VIDEO_FORMATS:
+            if shutil.which("ffmpeg"):
+                directory, video = None, output
+            else:
+                directory = os.path.splitext(output)[0] + "_frames"
+                print(f"[⚠] ffmpeg not found, writing an image sequence to {directory} instead of a video")
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        width, height = size
+        self.blocks = [shared_memory.SharedMemory(create=True, size=width * height * 4) for _ in range(queue_size)]
+        self.surfaces = [pygame.image.frombuffer(block.buf, size, "RGBX") for block in self.blocks]
+        self.buffers = {id(surface): k for k, surface in enumerate(self.surfaces)}
+        self.frames = multiprocessing.Queue()
+        self.free = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        for k in range(queue_size):
+            self.free.put(k)
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.process = multiprocessing.Process(
+            target=encode_frames, daemon=True,
+            args=([block.name for block in self.blocks], size, directory, image_format, video, fps,
+                  self.frames, self.free, self.results))
+        self.process.start()
+        atexit.register(self.close)
+
+    def acquire(self, wait=False):
+        # A free surface to draw the next frame on, or None when the encoder is behind;
+        # with wait, blocks until the encoder hands one back instead of dropping the frame
+        try:
+            return self.surfaces[self.free.get(block=wait)]
+        except queue.Empty:
+            self.dropped += 1
+            return None
+
+    def submit(self, surface, number=None):
+        # surface must come from acquire(); number names the image file (default: frames submitted so far)
+        self.frames.put((self.submitted if number is None else number, self.buffers[id(surface)]))
+        self.submitted += 1
+
+    def capture(self, screen, number=None):
+        # Records a surface that is drawn on again afterwards (e.g. the display): one blit into the pool
+        surface = self.acquire()
+        if surface is None:
+            return False
+        surface.blit(screen, (0, 0))
+        self.submit(surface, number)
+        return True
+
+    def close(self):
+        # Writes out the queued frames, finishes the video and frees the buffers
+        if not self.blocks:
+            return
+        self.frames.put(None)
+        try:
+            while True:
+                try:
+                    self.written, error = self.results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if not self.process.is_alive():
+                        error = f"the encoder process exited with code {self.process.exitcode}"
+                        break
+        finally:
+            self.process.join()
+            self.surfaces, self.buffers = [], {}
+            for block in self.blocks:
+                block.close()
+                block.unlink()
+            self.blocks = []
+        if error is not None:
+            raise RuntimeError(f"Recording to {self.output} failed: {error}")
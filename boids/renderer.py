@@ -0,0 +1,120 @@
+import math
+import numpy as np
+import pygame
+
+BOID_COLOR = (0, 255, 255)
+LEADER_COLOR = (255, 0, 255)
+PREDATOR_COLOR = (255, 0, 0)
+TRANSPARENT = (0, 0, 0)
+ANGLE_BUCKETS = 72  # 5 degree steps
+NOSE = 10  # Boid.draw: tip 10 px ahead, wings 5 px back at +-135 degrees
+WING = 5
+
+
+def boid_sprite(heading, color=BOID_COLOR):
+    # The Boid.draw polygon for one heading (radians), with the boid's position at the sprite centre
+    size = 2 * NOSE + 3
+    center = NOSE + 1
+    sprite = pygame.Surface((size, size))
+    sprite.fill(TRANSPARENT)
+    sprite.set_colorkey(TRANSPARENT, pygame.RLEACCEL)
+    points = [
+        (center + NOSE * math.cos(heading), center + NOSE * math.sin(heading)),
+        (center + WING * math.cos(heading + math.radians(135)), center + WING * math.sin(heading + math.radians(135))),
+        (center, center),
+        (center + WING * math.cos(heading - math.radians(135)), center + WING * math.sin(heading - math.radians(135)))
+    ]
+    pygame.draw.polygon(sprite, color, points)
+    return sprite
+
+
+def swarm_arrays(env):
+    # Boid positions and velocities as (N, 2) arrays, straight from the engine when there is one
+    return env.swarm_state()
+
+
+def interpolate(previous, current, alpha, width, height):
+    # Blend two simulation states for rendering; boids that wrapped around the screen are not blended
+    delta = current - previous
+    jumped = (np.abs(delta) > (width / 2, height / 2)).any(axis=1)
+    blended = previous + delta * alpha
+    blended[jumped] = current[jumped]
+    return blended
+
+
+class TextCache:
+    # Rendered text surfaces keyed by content, so an unchanged HUD line is rendered only once
+    def __init__(self, size=20, color=(255, 255, 255), limit=256):
+        self.font = pygame.font.SysFont(None, size)
+        self.color = color
+        self.limit = limit
+        self.surfaces = {}
+
+    def render(self, text):
+        surface = self.surfaces.get(text)
+        if surface is None:
+            if len(self.surfaces) >= self.limit:
+                self.surfaces.clear()
+            surface = self.surfaces[text] = self.font.render(text, True, self.color)
+        return surface
+
+    def draw_lines(self, screen, lines, x=10, y=10, spacing=20):
+        for i, line in enumerate(lines):
+            screen.blit(self.render(line), (x, y + i * spacing))
+
+
+class SpriteRenderer:
+    # Draws the same picture as Environment.draw, but boids are blitted in bulk from a pre-rotated atlas
+    # and the obstacles come from a cached background layer
+    def __init__(self, buckets=ANGLE_BUCKETS):
+        self.buckets = buckets
+        self.atlas = [boid_sprite(2 * math.pi * k / buckets) for k in range(buckets)]
+        if pygame.display.get_init() and pygame.display.get_surface() is not None:
+            self.atlas = [sprite.convert() for sprite in self.atlas]
+        self.offset = NOSE + 1
+        self.background = None
+        self.background_key = None
+
+    def invalidate(self):
+        # Call after changing obstacles in place
+        self.background = None
+
+    def obstacle_layer(self, env, size):
+        key = (id(env.obstacles), len(env.obstacles), size)
+        if self.background is None or key != self.background_key:
+            self.background = pygame.Surface(size)
+            self.background.fill(TRANSPARENT)
+            self.background.set_colorkey(TRANSPARENT, pygame.RLEACCEL)
+            for obs in env.obstacles:
+                obs.draw(self.background)
+            self.background_key = key
+        return self.background
+
+    def draw(self, env, screen, positions=None, ticks=None):
+        # positions overrides where the boids are drawn, e.g. interpolated between two steps;
+        # ticks (ms) sets the leader's pulse, which otherwise follows the clock
+        screen.blit(self.obstacle_layer(env, screen.get_size()), (0, 0))
+
+        leader = env.leader_index
+        if env.num_boids:
+            current, velocities = swarm_arrays(env)
+            if positions is None:
+                positions = current
+            headings = np.arctan2(velocities[:, 1], velocities[:, 0])
+            buckets = np.rint(headings * (self.buckets / (2 * math.pi))).astype(np.int64) % self.buckets
+            corners = (positions - self.offset).astype(np.int64)
+            keep = np.ones(len(positions), dtype=bool)
+            if leader is not None:
+                keep[leader] = False
+            atlas = self.atlas
+            screen.blits([(atlas[k], corner) for k, corner in zip(buckets[keep].tolist(), corners[keep].tolist())],
+                         doreturn=False)
+
+        if leader is not None:
+            pulse = 6 + 2 * math.sin((pygame.time.get_ticks() if ticks is None else ticks) * 0.005)
+            x, y = positions[leader]
+            pygame.draw.circle(screen, LEADER_COLOR, (int(x), int(y)), int(pulse))
+
+        if env.predators is not None:
+            for x, y in env.predators.positions.tolist():
+                pygame.draw.circle(screen, PREDATOR_COLOR, (int(x), int(y)), 8)
@@ -1,11 +1,13 @@
-import pygame
-from pygame.math import Vector2
+import math
 
 MAX_SPEED = 4
 NEIGHBOR_RADIUS = 50
 
+# The Vector2 rules below make their zero vectors with type(boid.position)(), the boid's own vector
+# class, so this module does not import pygame
+
 def separation(boid, boids, desired_distance=20):
-    steer = Vector2()
+    steer = type(boid.position)()
     count = 0
     for other in boids:
         distance = boid.position.distance_to(other.position)
@@ -25,7 +27,7 @@ def separation(boid, boids, desired_distance=20):
     return steer
 
 def alignment(boid, boids, neighbor_dist=NEIGHBOR_RADIUS):
-    avg_velocity = Vector2()
+    avg_velocity = type(boid.position)()
     count = 0
     for other in boids:
         distance = boid.position.distance_to(other.position)
@@ -40,10 +42,10 @@ def alignment(boid, boids, neighbor_dist=NEIGHBOR_RADIUS):
             if steer.length() > 0.05:
                 steer.scale_to_length(0.05)
             return steer
-    return Vector2()
+    return type(boid.position)()
 
 def cohesion(boid, boids, neighbor_dist=NEIGHBOR_RADIUS):
-    center_mass = Vector2()
+    center_mass = type(boid.position)()
     count = 0
     for other in boids:
         distance = boid.position.distance_to(other.position)
@@ -53,7 +55,7 @@ def cohesion(boid, boids, neighbor_dist=NEIGHBOR_RADIUS):
     if count > 0:
         center_mass /= count
         return seek(boid, center_mass)
-    return Vector2()
+    return type(boid.position)()
 
 def seek(boid, target):
     desired = target - boid.position
@@ -63,4 +65,66 @@ def seek(boid, target):
         if steer.length() > 0.05:
             steer.scale_to_length(0.05)
         return steer
-    return Vector2()
+    return type(boid.position)()
+
+def limit(x, y, max_length):
+    # In-place style scale_to_length cap on plain floats
+    length = math.sqrt(x * x + y * y)
+    if length > max_length:
+        fraction = max_length / length
+        return x * fraction, y * fraction
+    return x, y
+
+def flock(boid, boids, sep_weight=1.0, ali_weight=1.0, coh_weight=1.0, desired_distance=20, neighbor_dist=100):
+    # separation, alignment and cohesion in a single pass over boids, on plain floats, added straight
+    # into boid.acceleration; gives the same numbers as the Vector2 functions above without creating vectors
+    px, py = boid.position.x, boid.position.y
+    vx, vy = boid.velocity.x, boid.velocity.y
+    sep_x = sep_y = ali_x = ali_y = coh_x = coh_y = 0.0
+    close = near = 0
+    for other in boids:
+        position = other.position
+        dx, dy = px - position.x, py - position.y
+        distance = math.sqrt(dx * dx + dy * dy)
+        if distance <= 0:
+            continue
+        if distance < desired_distance:
+            # diff.normalize() / distance; Vector2 divides by multiplying with the reciprocal
+            sep_x += dx / distance * (1 / distance)
+            sep_y += dy / distance * (1 / distance)
+            close += 1
+        if distance < neighbor_dist:
+            velocity = other.velocity
+            ali_x += velocity.x
+            ali_y += velocity.y
+            coh_x += position.x
+            coh_y += position.y
+            near += 1
+
+    if close > 0:
+        sep_x *= 1 / close
+        sep_y *= 1 / close
+    if sep_x * sep_x + sep_y * sep_y > 0:
+        fraction = MAX_SPEED / math.sqrt(sep_x * sep_x + sep_y * sep_y)
+        sep_x, sep_y = limit(sep_x * fraction - vx, sep_y * fraction - vy, 0.05)
+
+    if near > 0:
+        ali_x *= 1 / near
+        ali_y *= 1 / near
+        if ali_x * ali_x + ali_y * ali_y > 0:
+            fraction = MAX_SPEED / math.sqrt(ali_x * ali_x + ali_y * ali_y)
+            ali_x, ali_y = limit(ali_x * fraction - vx, ali_y * fraction - vy, 0.05)
+        else:
+            ali_x = ali_y = 0.0
+        # seek(boid, center_mass)
+        coh_x = coh_x * (1 / near) - px
+        coh_y = coh_y * (1 / near) - py
+        if coh_x * coh_x + coh_y * coh_y > 0:
+            fraction = MAX_SPEED / math.sqrt(coh_x * coh_x + coh_y * coh_y)
+            coh_x, coh_y = limit(coh_x * fraction - vx, coh_y * fraction - vy, 0.05)
+        else:
+            coh_x = coh_y = 0.0
+
+    acceleration = boid.acceleration
+    acceleration.x += sep_x * sep_weight + ali_x * ali_weight + coh_x * coh_weight
+    acceleration.y += sep_y * sep_weight + ali_y * ali_weight + coh_y * coh_weight
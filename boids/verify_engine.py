@@ -0,0 +1,116 @@
+import copy
+import os
+import sys
+import tempfile
+import numpy as np
+from .environment import Environment
+from .engine import FlockEngine
+from .ensemble import Ensemble
+from .jit_engine import JitEngine, HAVE_NUMBA
+from .neighbors import make_index
+
+WIDTH, HEIGHT = 800, 600
+SEED = 4105
+NUM_BOIDS = 60
+STEPS = 200
+TOLERANCE = 1e-6
+
+# Weight sets from experiment_runner plus the default
+WEIGHT_SETS = [
+    (1.0, 1.0, 1.0),
+    (2.0, 0.5, 0.5),
+    (0.5, 2.0, 1.5)
+]
+
+
+def reference_step(env, sep, ali, coh):
+    # Boid/utils rules, with every force evaluated before any boid moves
+    snapshot = copy.deepcopy(env.boids)
+    collisions = 0
+    for i, boid in enumerate(env.boids):
+        boid.apply_behavior(snapshot, sep_weight=sep, ali_weight=ali, coh_weight=coh)
+        env.flee_predator(boid)
+        for other in snapshot[i+1:]:
+            if snapshot[i].position.distance_to(other.position) < 5:
+                collisions += 1
+        env.avoid_obstacles(boid)
+        if boid is not env.leader:
+            env.follow_leader(boid)
+    for boid in env.boids:
+        boid.update()
+    return collisions
+
+
+def state_of(boids):
+    return np.array([(b.position.x, b.position.y, b.velocity.x, b.velocity.y) for b in boids])
+
+
+def check(sep, ali, coh, index, engine_class=FlockEngine):
+    env = Environment(WIDTH, HEIGHT, NUM_BOIDS, sep, ali, coh, with_predator=True, seed=SEED)
+    env.predators.positions[0] = WIDTH / 2, HEIGHT / 2
+    engine = engine_class.from_boids(env.boids, WIDTH, HEIGHT, make_index(index, WIDTH, HEIGHT))
+    obstacle_positions = [(obs.position.x, obs.position.y) for obs in env.obstacles]
+    obstacle_sizes = [obs.size for obs in env.obstacles]
+
+    worst = 0.0
+    for step in range(STEPS):
+        expected_collisions = reference_step(env, sep, ali, coh)
+        collisions = engine.step(sep, ali, coh,
+                                 predator_position=env.predators.positions,
+                                 obstacle_positions=obstacle_positions,
+                                 obstacle_sizes=obstacle_sizes,
+                                 leader_index=0)
+        actual = np.hstack([engine.positions, engine.velocities])
+        error = np.abs(actual - state_of(env.boids)).max()
+        worst = max(worst, error)
+        if error > TOLERANCE or collisions != expected_collisions:
+            print(f"[FAIL] {engine_class.__name__} {index} sep={sep} ali={ali} coh={coh} step {step}: "
+                  f"max error {error:.3e}, collisions {collisions} vs {expected_collisions}")
+            return False
+    print(f"[OK] {engine_class.__name__} {index} sep={sep} ali={ali} coh={coh}: {STEPS} steps, max error {worst:.3e}")
+    return True
+
+
+def check_ensemble(directory):
+    # Every replica of one ensemble against the same environment stepped on its own (numpy, brute force)
+    configs = [(weights, predator) for weights in WEIGHT_SETS for predator in (False, True)]
+
+    def environments(tag):
+        return [Environment(WIDTH, HEIGHT, NUM_BOIDS, *weights, with_predator=predator, seed=SEED + k,
+                            backend="numpy", log_file=os.path.join(directory, f"{tag}_{k}.csv"))
+                for k, (weights, predator) in enumerate(configs)]
+
+    alone = environments("alone")
+    for env in alone:
+        for _ in range(STEPS):
+            env.update()
+        env.close()
+    replicas = environments("ensemble")
+    ensemble = Ensemble(replicas)
+    ensemble.run(STEPS)
+    ensemble.close()
+    worst = max(np.abs(np.hstack(a.swarm_state()) - np.hstack(b.swarm_state())).max() for a, b in zip(alone, replicas))
+    same_collisions = all(np.array_equal(np.loadtxt(a.log_file, delimiter=",", skiprows=1)[:, -1],
+                                         np.loadtxt(b.log_file, delimiter=",", skiprows=1)[:, -1])
+                          for a, b in zip(alone, replicas))
+    if worst > TOLERANCE or not same_collisions:
+        print(f"[FAIL] Ensemble of {len(configs)} replicas: max error {worst:.3e}, "
+              f"{'same' if same_collisions else 'different'} collisions")
+        return False
+    print(f"[OK] Ensemble of {len(configs)} replicas: {STEPS} steps, max error {worst:.3e}")
+    return True
+
+
+def main():
+    engines = [FlockEngine, JitEngine] if HAVE_NUMBA else [FlockEngine]
+    if not HAVE_NUMBA:
+        print("[⚠] Numba is not installed, skipping the jit engine")
+    results = [check(*weights, index, engine_class) for engine_class in engines
+               for index in ("brute", "grid") for weights in WEIGHT_SETS]
+    with tempfile.TemporaryDirectory() as directory:
+        results.append(check_ensemble(directory))
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
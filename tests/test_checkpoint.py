@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+from boids.environment import Environment
+
+WIDTH, HEIGHT = 800, 600
+
+
+def run(env, steps):
+    for _ in range(steps):
+        env.update()
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_resumed_checkpoint_moves_as_the_original(tmp_path, backend):
+    env = Environment(WIDTH, HEIGHT, 50, 2.0, 0.5, 0.5, with_predator=True, seed=5, backend=backend,
+                      neighbor_index="grid", log_file=str(tmp_path / "a.csv"))
+    run(env, 20)
+    path = str(tmp_path / "state.npz")
+    env.save_checkpoint(path)
+    run(env, 30)
+    resumed = Environment.load_checkpoint(path, log_file=str(tmp_path / "b.csv"))
+    assert resumed.backend == backend and resumed.step == 20 and resumed.leader_index == 0
+    run(resumed, 30)
+    assert np.array_equal(np.hstack(resumed.swarm_state()), np.hstack(env.swarm_state()))
+    assert np.array_equal(resumed.predators.positions, env.predators.positions)
+    assert resumed.collisions == env.collisions
+    env.close()
+    resumed.close()
+
+
+def test_checkpoint_overrides_fork_a_variant(tmp_path):
+    env = Environment(WIDTH, HEIGHT, 30, seed=2, backend="numpy", log_file=str(tmp_path / "a.csv"))
+    run(env, 10)
+    fork = Environment.from_checkpoint(env.checkpoint(), cohesion_strength=1.5, log_file=str(tmp_path / "b.csv"))
+    assert fork.cohesion_strength == 1.5 and fork.separation_strength == env.separation_strength
+    assert np.array_equal(np.hstack(fork.swarm_state()), np.hstack(env.swarm_state()))
+    assert fork.rng.getstate() == env.rng.getstate()
+    env.close()
+    fork.close()
@@ -0,0 +1,110 @@
+import pytest
+import numpy as np
+from boids import verify_engine
+from boids.environment import Environment
+from boids.engine import FlockEngine
+from boids.jit_engine import JitEngine, HAVE_NUMBA
+from boids.neighbors import make_index
+from boids.utils import separation, alignment, cohesion
+
+pygame = pytest.importorskip("pygame")
+
+WIDTH, HEIGHT = 800, 600
+STEPS = 100
+
+
+def original_step(env):
+    # The per-boid loop of the original Environment.update on Vector2s: every boid steers from the
+    # swarm as it is at its turn and moves right away
+    boids = env.boid_list
+    collisions = sum(a.position.distance_to(b.position) < 5 for i, a in enumerate(boids) for b in boids[i + 1:])
+    env.step += 1
+    env.predators.move()
+    leader = boids[env.leader_index]
+    for boid in boids:
+        sep = separation(boid, boids) * env.separation_strength
+        ali = alignment(boid, boids, neighbor_dist=100) * env.alignment_strength
+        coh = cohesion(boid, boids, neighbor_dist=100) * env.cohesion_strength
+        boid.acceleration += sep + ali + coh
+        for x, y in env.predators.positions.tolist():
+            distance = boid.position.distance_to((x, y))
+            if distance < 100:
+                away = boid.position - pygame.Vector2(x, y)
+                if away.length_squared() > 0:
+                    boid.acceleration += away.normalize() * ((100 - distance) / 100) * 2.0
+        for obs in env.obstacles:
+            center = pygame.Vector2(obs.position.x, obs.position.y)
+            distance = boid.position.distance_to(center)
+            safe_distance = obs.size + 30
+            if distance < safe_distance:
+                away = boid.position - center
+                if away.length_squared() > 0:
+                    boid.acceleration += away.normalize() * ((safe_distance - distance) / safe_distance) * 1.5
+        if boid is not leader:
+            desired = leader.position - boid.position
+            if desired.length() > 0:
+                desired.scale_to_length(4)
+                steer = desired - boid.velocity
+                if steer.length() > 0.05:
+                    steer.scale_to_length(0.05)
+                boid.acceleration += steer * 0.05
+        boid.update()
+    return collisions
+
+
+@pytest.mark.parametrize("index", ["brute", "grid"])
+def test_python_backend_moves_as_the_original_rules(tmp_path, index):
+    options = dict(with_predator=True, seed=11, backend="python", neighbor_index=index)
+    env = Environment(WIDTH, HEIGHT, 40, log_file=str(tmp_path / "log.csv"), **options)
+    reference = Environment(WIDTH, HEIGHT, 40, **options)
+    for _ in range(STEPS):
+        env.update()
+        collisions = original_step(reference)
+        assert env.collisions == collisions
+        assert np.array_equal(np.hstack(env.swarm_state()), np.hstack(reference.swarm_state()))
+    env.close()
+
+
+@pytest.mark.parametrize("engine_class", [FlockEngine, JitEngine])
+@pytest.mark.parametrize("index", ["brute", "grid"])
+@pytest.mark.parametrize("weights", verify_engine.WEIGHT_SETS)
+def test_engine_matches_reference(engine_class, index, weights):
+    if engine_class is JitEngine and not HAVE_NUMBA:
+        pytest.skip("numba is not installed")
+    env = Environment(WIDTH, HEIGHT, 40, *weights, with_predator=True, seed=3)
+    env.predators.positions[0] = WIDTH / 2, HEIGHT / 2
+    engine = engine_class.from_boids(env.boids, WIDTH, HEIGHT, make_index(index, WIDTH, HEIGHT))
+    obstacle_positions = [(obs.position.x, obs.position.y) for obs in env.obstacles]
+    obstacle_sizes = [obs.size for obs in env.obstacles]
+    for _ in range(STEPS):
+        expected = verify_engine.reference_step(env, *weights)
+        collisions = engine.step(*weights, predator_position=env.predators.positions,
+                                 obstacle_positions=obstacle_positions, obstacle_sizes=obstacle_sizes,
+                                 leader_index=0)
+        assert collisions == expected
+        np.testing.assert_allclose(np.hstack([engine.positions, engine.velocities]),
+                                   verify_engine.state_of(env.boids), rtol=0, atol=verify_engine.TOLERANCE)
+
+
+@pytest.mark.skipif(not HAVE_NUMBA, reason="numba is not installed")
+@pytest.mark.parametrize("avoidance", ["center", "sdf"])
+@pytest.mark.parametrize("periodic", [False, True])
+def test_jit_matches_numpy_with_obstacle_field_and_predators(avoidance, periodic):
+    from boids.obstacles import ObstacleField, random_obstacle_map
+    rng = np.random.default_rng(1)
+    positions = rng.uniform(0, (WIDTH, HEIGHT), (300, 2))
+    velocities = rng.uniform(-2, 2, (300, 2))
+    predators = rng.uniform(0, (WIDTH, HEIGHT), (10, 2))
+    field = ObstacleField(random_obstacle_map(100, WIDTH, HEIGHT, seed=3), avoidance)
+    engines = [engine_class(positions, velocities, WIDTH, HEIGHT,
+                            make_index("grid", WIDTH, HEIGHT, periodic=periodic))
+               for engine_class in (FlockEngine, JitEngine)]
+    for _ in range(50):
+        numpy_collisions, jit_collisions = (engine.step(predator_position=predators, obstacle_field=field,
+                                                        leader_index=0) for engine in engines)
+        assert numpy_collisions == jit_collisions
+    np.testing.assert_allclose(engines[1].positions, engines[0].positions, rtol=0, atol=verify_engine.TOLERANCE)
+
+
+def test_ensemble_matches_standalone_runs(tmp_path):
+    assert verify_engine.check_ensemble(str(tmp_path))
@@ -0,0 +1,65 @@
+import os
+from boids.catalog import connect, find_runs
+from boids.experiment_runner import experiment_label, finish_run, log_path, make_environment, run_sweep
+
+CONFIGS = [(30, 1.0, 1.0, 1.0, False), (30, 2.0, 0.5, 0.5, True)]
+STEPS = 5
+
+
+def sweep(results_dir, **options):
+    return run_sweep(CONFIGS, workers=1, steps=STEPS, backend="numpy", results_dir=results_dir, **options)
+
+
+def catalogued(results_dir):
+    db = connect(results_dir)
+    paths = [run["path"] for run in find_runs(db)]
+    db.close()
+    return paths
+
+
+def test_sweep_resumes_where_it_stopped(tmp_path):
+    results_dir = str(tmp_path)
+    logs = [log_path(experiment_label(*config), results_dir=results_dir) for config in CONFIGS]
+    assert len(sweep(results_dir)) == 2
+    assert all(os.path.exists(log) for log in logs)
+    assert catalogued(results_dir) == sorted(os.path.basename(log) for log in logs)
+
+    # Everything is done: nothing runs again
+    assert sweep(results_dir) == []
+
+    # A deleted log, or one left unfinished as .part, is run again; the other config is skipped
+    os.remove(logs[0])
+    with open(log_path(experiment_label(*CONFIGS[0]), ".part.csv", results_dir), "w") as f:
+        f.write("Step\n")
+    results = sweep(results_dir)
+    assert [result["config"]["label"] for result in results] == [experiment_label(*CONFIGS[0])]
+    assert results[0]["complete"] and results[0]["steps"] == STEPS
+    assert not os.path.exists(log_path(experiment_label(*CONFIGS[0]), ".part.csv", results_dir))
+
+    # --force runs everything again
+    assert len(sweep(results_dir, resume=False)) == 2
+
+
+def test_sweep_seeds_do_not_depend_on_the_order(tmp_path):
+    forward = {result["config"]["label"]: result["seed"] for result in sweep(str(tmp_path / "a"))}
+    backward = {result["config"]["label"]: result["seed"]
+                for result in run_sweep(CONFIGS[::-1], workers=1, steps=STEPS, backend="numpy",
+                                        results_dir=str(tmp_path / "b"))}
+    assert forward == backward
+
+
+def test_incomplete_run_keeps_its_part_log(tmp_path):
+    results_dir = str(tmp_path)
+    config = CONFIGS[0]
+    env = make_environment(config, "numpy", 1, results_dir=results_dir)
+    env.update()
+    part = env.log_file
+    result = finish_run(env, config, 0.1, 1, ".csv", STEPS, "numpy", results_dir, complete=False)
+    assert not result["complete"] and result["log_file"] == part
+    assert os.path.exists(part) and not os.path.exists(log_path(experiment_label(*config), results_dir=results_dir))
+
+
+def test_ensemble_sweep_writes_every_log(tmp_path):
+    results = sweep(str(tmp_path), ensemble=True)
+    assert sorted(result["config"]["label"] for result in results) == sorted(experiment_label(*c) for c in CONFIGS)
+    assert all(result["steps"] == STEPS and os.path.exists(result["log_file"]) for result in results)